@@ -1,706 +1,3114 @@
-"""
-ClarityNet - Enhanced Backend Module with TRUE Multi-Media Support
-Now with actual video/audio processing and intelligent reasoning explanations
-"""
-
-import google.generativeai as genai
-from config import (
-    GEMINI_API_KEY, MODELS, MODEL_NAMES, COMPLEXITY_THRESHOLD,
-    WORD_COUNT_THRESHOLD, TECHNICAL_KEYWORDS, GENERATION_CONFIG
-)
-import time
-from typing import Optional, Dict, Any, List, Union
-from PIL import Image
-import threading
-import io
-
-
-class RateLimiter:
-    """Simple rate limiter to track API calls"""
-    
-    def __init__(self, max_calls: int = 2, period: float = 60.0):
-        self.max_calls = max_calls
-        self.period = period
-        self.calls = []
-        self.lock = threading.Lock()
-    
-    def can_call(self) -> tuple[bool, float]:
-        """Check if we can make a call, return (can_call, wait_time)"""
-        with self.lock:
-            now = time.time()
-            self.calls = [call_time for call_time in self.calls if now - call_time < self.period]
-            
-            if len(self.calls) < self.max_calls:
-                self.calls.append(now)
-                return True, 0.0
-            else:
-                oldest_call = min(self.calls)
-                wait_time = self.period - (now - oldest_call) + 1
-                return False, wait_time
-    
-    def reset(self):
-        """Reset the rate limiter"""
-        with self.lock:
-            self.calls = []
-
-
-class ClarityNetEngine:
-    """Enhanced engine for ClarityNet AI with TRUE multimedia support"""
-    
-    def __init__(self):
-        """Initialize Gemini models with caching and error handling"""
-        genai.configure(api_key=GEMINI_API_KEY)
-        
-        self.rapid_limiter = RateLimiter(max_calls=15, period=60.0)
-        self.advanced_limiter = RateLimiter(max_calls=2, period=60.0)
-        
-        # Initialize models with fallbacks
-        try:
-            print(f"🔄 Initializing Rapid Model: {MODELS['rapid']}")
-            self.rapid_model = genai.GenerativeModel(MODELS["rapid"])
-            print(f"✅ Rapid Model Ready: {MODELS['rapid']}")
-        except Exception as e:
-            print(f"❌ Error initializing rapid model: {e}")
-            try:
-                fallback_rapid = "gemini-2.0-flash"
-                print(f"🔄 Trying fallback: {fallback_rapid}")
-                self.rapid_model = genai.GenerativeModel(fallback_rapid)
-                print(f"✅ Fallback Rapid Model Ready: {fallback_rapid}")
-            except Exception as e2:
-                raise Exception(f"Failed to initialize any rapid model: {e2}")
-        
-        try:
-            print(f"🔄 Initializing Advanced Model: {MODELS['advanced']}")
-            self.advanced_model = genai.GenerativeModel(MODELS["advanced"])
-            print(f"✅ Advanced Model Ready: {MODELS['advanced']}")
-        except Exception as e:
-            print(f"❌ Error initializing advanced model: {e}")
-            try:
-                fallback_advanced = "gemini-2.5-pro"
-                print(f"🔄 Trying fallback: {fallback_advanced}")
-                self.advanced_model = genai.GenerativeModel(fallback_advanced)
-                print(f"✅ Fallback Advanced Model Ready: {fallback_advanced}")
-            except Exception as e2:
-                raise Exception(f"Failed to initialize any advanced model: {e2}")
-        
-        self._response_cache = {}
-        self._explanation_cache = {}
-        self._start_time = None
-        self.explanation_enabled = True
-        print("✅ ClarityNet Engine Initialized Successfully!\n")
-    
-    def analyze_query(self, query: str, media_info: Dict[str, Any] = None) -> Dict[str, Any]:
-        """
-        Advanced query analysis with multi-dimensional scoring
-        Now properly handles video and audio metadata
-        """
-        if media_info is None:
-            media_info = {"has_image": False, "has_video": False, "has_audio": False}
-        
-        words = query.split()
-        word_count = len(words)
-        char_count = len(query)
-        
-        # Enhanced technical keyword detection
-        technical_score = sum(
-            3 if keyword in query.lower() else 0
-            for keyword in TECHNICAL_KEYWORDS
-        )
-        has_technical = technical_score > 0
-        
-        # Question complexity indicators
-        has_multiple_questions = query.count('?') > 1
-        has_comparisons = any(word in query.lower() for word in ['compare', 'versus', 'vs', 'difference'])
-        has_explanations = any(word in query.lower() for word in ['explain', 'why', 'how', 'analyze'])
-        
-        # Media complexity weights
-        has_image = media_info.get("has_image", False)
-        has_video = media_info.get("has_video", False)
-        has_audio = media_info.get("has_audio", False)
-        
-        # Calculate weighted complexity score
-        base_complexity = min(word_count / 50, 1.0) * 0.3
-        technical_weight = min(technical_score / 10, 1.0) * 0.25
-        
-        # Video requires more processing than images
-        media_weight = (
-            (0.35 if has_video else 0) +
-            (0.25 if has_audio else 0) +
-            (0.20 if has_image and not has_video else 0)
-        )
-        
-        question_weight = (
-            (0.1 if has_multiple_questions else 0) +
-            (0.05 if has_comparisons else 0) +
-            (0.05 if has_explanations else 0)
-        )
-        
-        complexity_score = min(
-            base_complexity + technical_weight + media_weight + question_weight,
-            1.0
-        )
-        
-        # Smart model selection - video/audio ALWAYS use advanced
-        use_advanced = (
-            has_video or
-            has_audio or
-            complexity_score > COMPLEXITY_THRESHOLD or
-            has_technical or
-            word_count > WORD_COUNT_THRESHOLD or
-            has_image or
-            has_multiple_questions or
-            (has_comparisons and word_count > 10)
-        )
-        
-        # Generate reasoning
-        model_selection_reasoning = self._generate_model_selection_reasoning(
-            use_advanced, has_technical, has_image, has_video, has_audio,
-            complexity_score, has_multiple_questions, has_comparisons, has_explanations
-        )
-        
-        return {
-            "complexity_score": round(complexity_score, 3),
-            "word_count": word_count,
-            "char_count": char_count,
-            "has_technical": has_technical,
-            "technical_score": technical_score,
-            "has_image": has_image,
-            "has_video": has_video,
-            "has_audio": has_audio,
-            "has_multiple_questions": has_multiple_questions,
-            "has_comparisons": has_comparisons,
-            "has_explanations": has_explanations,
-            "use_advanced": use_advanced,
-            "model_name": MODEL_NAMES["advanced"] if use_advanced else MODEL_NAMES["rapid"],
-            "model_selection_reasoning": model_selection_reasoning
-        }
-    
-    def _generate_model_selection_reasoning(
-        self, use_advanced: bool, has_technical: bool, has_image: bool,
-        has_video: bool, has_audio: bool, score: float,
-        has_multiple: bool, has_comparisons: bool, has_explanations: bool
-    ) -> str:
-        """Generate detailed reasoning for model selection"""
-        reasons = []
-        
-        if has_video:
-            reasons.append("🎬 video analysis with temporal understanding required")
-        if has_audio:
-            reasons.append("🎵 audio processing and speech analysis needed")
-        if has_image and not has_video:
-            reasons.append("🎨 visual analysis required")
-        if has_technical:
-            reasons.append("🔬 specialized technical knowledge needed")
-        if has_multiple:
-            reasons.append("❓ multiple questions requiring comprehensive coverage")
-        if has_comparisons:
-            reasons.append("⚖️ comparative evaluation needed")
-        if has_explanations:
-            reasons.append("📚 deep explanatory analysis required")
-        if score > COMPLEXITY_THRESHOLD and not reasons:
-            reasons.append("🧩 high complexity query detected")
-        
-        if use_advanced:
-            reason_text = ", ".join(reasons) if reasons else "comprehensive analysis needed"
-            return f"**Advanced Reasoning Engine** selected: {reason_text}"
-        else:
-            return "**Rapid Response Engine** selected: straightforward query optimized for speed"
-    
-    def _upload_media_file(self, file_bytes: bytes, mime_type: str, display_name: str):
-        """Upload media file to Gemini API for processing"""
-        try:
-            uploaded_file = genai.upload_file(
-                io.BytesIO(file_bytes),
-                mime_type=mime_type,
-                display_name=display_name
-            )
-            return uploaded_file
-        except Exception as e:
-            print(f"❌ Error uploading media file: {e}")
-            return None
-    
-    def generate_response(
-        self,
-        query: str,
-        images: Optional[List[Image.Image]] = None,
-        video: Optional[Any] = None,
-        audio: Optional[Any] = None
-    ) -> Dict[str, Any]:
-        """
-        Generate AI response with TRUE multimedia support
-        Now handles images, video, AND audio properly!
-        """
-        self._start_time = time.time()
-        
-        # Prepare media info for analysis
-        media_info = {
-            "has_image": images is not None and len(images) > 0,
-            "has_video": video is not None,
-            "has_audio": audio is not None
-        }
-        
-        # Analyze query with proper media context
-        analysis = self.analyze_query(query, media_info)
-        
-        # Check cache (only for text-only queries)
-        cache_key = f"{query}_{analysis['model_name']}"
-        if cache_key in self._response_cache and not any(media_info.values()):
-            cached = self._response_cache[cache_key].copy()
-            cached['from_cache'] = True
-            cached['processing_time'] = time.time() - self._start_time
-            return cached
-        
-        try:
-            # Select model and rate limiter
-            use_advanced = analysis["use_advanced"]
-            model = self.advanced_model if use_advanced else self.rapid_model
-            limiter = self.advanced_limiter if use_advanced else self.rapid_limiter
-            
-            # Check rate limit
-            can_call, wait_time = limiter.can_call()
-            if not can_call:
-                return {
-                    "response": None,
-                    "answer_explanation": None,
-                    "analysis": analysis,
-                    "success": False,
-                    "error": f"Rate limit reached. Please wait {int(wait_time)} seconds.",
-                    "processing_time": time.time() - self._start_time,
-                    "from_cache": False,
-                    "rate_limited": True,
-                    "wait_time": wait_time
-                }
-            
-            # Build content array for API
-            content = [query]
-            
-            # Add images
-            if images:
-                content.extend(images[:2])  # Max 2 images
-            
-            # Add video (requires file upload)
-            if video:
-                try:
-                    video_bytes = video.read()
-                    video.seek(0)  # Reset for potential re-use
-                    
-                    # Determine mime type
-                    video_name = getattr(video, 'name', 'video.mp4')
-                    if video_name.endswith('.mp4'):
-                        mime_type = 'video/mp4'
-                    elif video_name.endswith('.mov'):
-                        mime_type = 'video/quicktime'
-                    elif video_name.endswith('.avi'):
-                        mime_type = 'video/x-msvideo'
-                    else:
-                        mime_type = 'video/mp4'
-                    
-                    uploaded_video = self._upload_media_file(video_bytes, mime_type, video_name)
-                    if uploaded_video:
-                        content.append(uploaded_video)
-                except Exception as e:
-                    print(f"⚠️ Video upload failed: {e}")
-            
-            # Add audio (requires file upload)
-            if audio:
-                try:
-                    audio_bytes = audio.read()
-                    audio.seek(0)
-                    
-                    audio_name = getattr(audio, 'name', 'audio.mp3')
-                    if audio_name.endswith('.mp3'):
-                        mime_type = 'audio/mpeg'
-                    elif audio_name.endswith('.wav'):
-                        mime_type = 'audio/wav'
-                    elif audio_name.endswith('.ogg'):
-                        mime_type = 'audio/ogg'
-                    else:
-                        mime_type = 'audio/mpeg'
-                    
-                    uploaded_audio = self._upload_media_file(audio_bytes, mime_type, audio_name)
-                    if uploaded_audio:
-                        content.append(uploaded_audio)
-                except Exception as e:
-                    print(f"⚠️ Audio upload failed: {e}")
-            
-            # Generate response
-            generation_config = genai.types.GenerationConfig(**GENERATION_CONFIG)
-            response = model.generate_content(content, generation_config=generation_config)
-            
-            # Extract response
-            response_text = self._safe_extract_text(response)
-            
-            # Generate SMART explanation
-            answer_explanation = self._generate_smart_explanation(
-                query, response_text, media_info, analysis, use_advanced
-            )
-            
-            processing_time = time.time() - self._start_time
-            
-            result = {
-                "response": response_text,
-                "answer_explanation": answer_explanation,
-                "analysis": analysis,
-                "success": True,
-                "error": None,
-                "processing_time": round(processing_time, 2),
-                "from_cache": False
-            }
-            
-            # Cache only text queries
-            if not any(media_info.values()) and len(self._response_cache) < 50:
-                self._response_cache[cache_key] = result.copy()
-            
-            return result
-            
-        except Exception as e:
-            error_msg = str(e)
-            
-            if "429" in error_msg or "quota" in error_msg.lower():
-                import re
-                wait_match = re.search(r'retry.*?(\d+(?:\.\d+)?)\s*s', error_msg, re.IGNORECASE)
-                wait_time = float(wait_match.group(1)) if wait_match else 60.0
-                
-                return {
-                    "response": None,
-                    "answer_explanation": None,
-                    "analysis": analysis,
-                    "success": False,
-                    "error": f"Rate limit exceeded. Please wait {int(wait_time)} seconds.",
-                    "processing_time": time.time() - self._start_time,
-                    "from_cache": False,
-                    "rate_limited": True,
-                    "wait_time": wait_time
-                }
-            
-            return {
-                "response": None,
-                "answer_explanation": None,
-                "analysis": analysis,
-                "success": False,
-                "error": error_msg,
-                "processing_time": time.time() - self._start_time,
-                "from_cache": False
-            }
-    
-    def _safe_extract_text(self, response) -> str:
-        """Safely extract text from response with comprehensive error handling"""
-        try:
-            if hasattr(response, 'text') and response.text:
-                return response.text
-            
-            if hasattr(response, 'candidates') and response.candidates:
-                candidate = response.candidates[0]
-                
-                if hasattr(candidate, 'finish_reason'):
-                    finish_reason = candidate.finish_reason
-                    
-                    if finish_reason == 1:
-                        if hasattr(candidate, 'content') and hasattr(candidate.content, 'parts'):
-                            parts_text = []
-                            for part in candidate.content.parts:
-                                if hasattr(part, 'text'):
-                                    parts_text.append(part.text)
-                            if parts_text:
-                                return ''.join(parts_text)
-                    
-                    elif finish_reason == 2:
-                        return "⚠️ Response blocked by safety filters. Please try rephrasing."
-                    elif finish_reason == 3:
-                        return "⚠️ Response blocked due to recitation concerns."
-                    elif finish_reason == 4:
-                        if hasattr(candidate, 'content') and hasattr(candidate.content, 'parts'):
-                            parts_text = []
-                            for part in candidate.content.parts:
-                                if hasattr(part, 'text'):
-                                    parts_text.append(part.text)
-                            if parts_text:
-                                return ''.join(parts_text) + "\n\n[Response truncated]"
-                        return "⚠️ Response exceeded maximum length."
-                    else:
-                        return f"⚠️ Response stopped (reason: {finish_reason})."
-            
-            return "Unable to generate response."
-            
-        except Exception as e:
-            return f"Error extracting response: {str(e)}"
-    
-    def _generate_smart_explanation(
-        self,
-        query: str,
-        answer: str,
-        media_info: Dict[str, Any],
-        analysis: Dict[str, Any],
-        use_advanced: bool
-    ) -> str:
-        """
-        Generate INTELLIGENT, context-aware explanations
-        Focuses on ACTUAL reasoning decisions, not generic descriptions
-        """
-        
-        if answer.startswith("⚠️"):
-            return "Explanation unavailable: Response was blocked or failed."
-        
-        explanation_parts = []
-        
-        # === PART 1: Input Processing Strategy ===
-        explanation_parts.append("🧠 Input Processing Strategy:")
-        
-        processing_decisions = []
-        
-        if media_info.get("has_video"):
-            processing_decisions.append(
-                "Video input required temporal analysis across frames - the AI extracted keyframes, "
-                "analyzed motion patterns, detected scene changes, and tracked object movements over time. "
-                "This multi-frame processing is computationally intensive and requires advanced vision models."
-            )
-        
-        if media_info.get("has_audio"):
-            processing_decisions.append(
-                "Audio analysis involved speech recognition, tone detection, and acoustic feature extraction. "
-                "The AI transcribed spoken content while analyzing vocal patterns, background sounds, and audio quality."
-            )
-        
-        if media_info.get("has_image") and not media_info.get("has_video"):
-            image_query_keywords = ['what', 'who', 'where', 'identify', 'describe', 'show']
-            if any(kw in query.lower() for kw in image_query_keywords):
-                processing_decisions.append(
-                    "Image recognition prioritized object detection and scene understanding - the AI identified "
-                    "entities, classified visual elements, and interpreted spatial relationships to answer your specific question."
-                )
-            else:
-                processing_decisions.append(
-                    "Visual context was integrated with linguistic analysis - the AI used image features "
-                    "to enhance understanding of your text query rather than just describing the image."
-                )
-        
-        if not any(media_info.values()):
-            # Pure text query - analyze linguistic complexity
-            if analysis.get("has_technical"):
-                processing_decisions.append(
-                    "Technical query triggered domain-specific knowledge retrieval - the AI accessed specialized "
-                    "knowledge bases and applied field-specific reasoning frameworks to ensure accuracy."
-                )
-            
-            if analysis.get("has_comparisons"):
-                processing_decisions.append(
-                    "Comparative analysis required building mental models of multiple entities, identifying "
-                    "relevant dimensions for comparison, and evaluating trade-offs across these dimensions."
-                )
-            
-            if analysis.get("has_multiple_questions"):
-                processing_decisions.append(
-                    "Multi-part question required query decomposition - the AI identified distinct sub-questions, "
-                    "determined optimal answering order, and ensured all parts received adequate coverage."
-                )
-        
-        if processing_decisions:
-            explanation_parts.append(" ".join(processing_decisions))
-        else:
-            explanation_parts.append(
-                "Straightforward text query processed through standard linguistic parsing and semantic understanding."
-            )
-        
-        # === PART 2: Reasoning Architecture Selection ===
-        explanation_parts.append("\n**⚙️ Reasoning Architecture Selection:**")
-        
-        if use_advanced:
-            architecture_reasoning = []
-            
-            if media_info.get("has_video") or media_info.get("has_audio"):
-                architecture_reasoning.append(
-                    "Selected advanced multimodal model because video/audio requires specialized processing "
-                    "capabilities not available in rapid models"
-                )
-            elif analysis.get("complexity_score", 0) > 0.6:
-                architecture_reasoning.append(
-                    f"Complexity score of {analysis.get('complexity_score', 0):.2f} indicated need for deep reasoning - "
-                    "advanced model provides better chain-of-thought capabilities and nuanced understanding"
-                )
-            elif analysis.get("has_technical"):
-                architecture_reasoning.append(
-                    "Technical content requires access to specialized knowledge and precise terminology - "
-                    "advanced model has broader domain coverage and better accuracy for expert-level queries"
-                )
-            else:
-                architecture_reasoning.append(
-                    "Advanced model selected to ensure comprehensive coverage and high-quality reasoning"
-                )
-            
-            explanation_parts.append(". ".join(architecture_reasoning) + ".")
-        else:
-            explanation_parts.append(
-                "Rapid model sufficient for this query - prioritized response speed while maintaining accuracy. "
-                "The query's straightforward nature didn't require deep reasoning chains or specialized processing."
-            )
-        
-        # === PART 3: Answer Construction Decisions ===
-        explanation_parts.append("\n**📝 Answer Construction Decisions:**")
-        
-        import re
-        answer_lower = answer.lower()
-        answer_words = answer.split()
-        
-        construction_choices = []
-        
-        # Analyze actual answer structure
-        has_code = '```' in answer
-        has_lists = bool(re.search(r'(\d+\.|[-•*])\s', answer))
-        has_examples = 'example' in answer_lower or 'instance' in answer_lower
-        has_steps = any(word in answer_lower for word in ['first', 'second', 'then', 'finally', 'step'])
-        
-        if has_code:
-            construction_choices.append(
-                "Included code examples because implementation details are more effective than abstract descriptions "
-                "for technical understanding"
-            )
-        
-        if has_lists and has_steps:
-            construction_choices.append(
-                "Structured as sequential steps because the query implied procedural knowledge - "
-                "ordered format aids execution and comprehension"
-            )
-        elif has_lists:
-            construction_choices.append(
-                "Used list format to present parallel information clearly - each item carries equal weight "
-                "and bullet points improve scannability"
-            )
-        
-        if has_examples:
-            construction_choices.append(
-                "Incorporated concrete examples because abstract concepts become clearer through specific instances - "
-                "examples bridge theory and practice"
-            )
-        
-        # Analyze answer length relative to query
-        answer_length = len(answer_words)
-        query_length = len(query.split())
-        
-        if answer_length > query_length * 5:
-            construction_choices.append(
-                f"Generated comprehensive {answer_length}-word response because your query required thorough exploration - "
-                "prioritized completeness over brevity"
-            )
-        elif answer_length < query_length * 2:
-            construction_choices.append(
-                f"Provided concise {answer_length}-word response because your query had a direct answer - "
-                "avoided unnecessary elaboration"
-            )
-        
-        if construction_choices:
-            explanation_parts.append(". ".join(construction_choices) + ".")
-        else:
-            explanation_parts.append(
-                "Constructed straightforward prose response appropriate for the query's nature."
-            )
-        
-        return "\n".join(explanation_parts)
-    
-    def get_influencing_factors(self, analysis: Dict, response: str, query: str) -> Dict[str, Dict]:
-        """Extract comprehensive influencing factors with better categorization"""
-        response_words = response.split()
-        response_length = len(response_words)
-        query_words = query.split()
-        query_complexity = len(query_words)
-        
-        has_technical_terms = any(keyword in response.lower() for keyword in TECHNICAL_KEYWORDS)
-        has_detailed_explanation = response_length > 100
-        has_structured_format = any(marker in response for marker in ['1.', '2.', '3.', '-', '*', '•', '\n\n'])
-        has_code_or_formulas = any(marker in response for marker in ['```', '`', '=', '()', '{}'])
-        
-        factors = {}
-        
-        # Video/Audio factors
-        if analysis.get("has_video"):
-            factors["temporal_analysis"] = {
-                "value": "✓ Active",
-                "impact": "Critical",
-                "description": "Frame-by-frame video analysis with motion tracking, scene detection, and temporal coherence understanding across the video timeline."
-            }
-        
-        if analysis.get("has_audio"):
-            factors["audio_processing"] = {
-                "value": "✓ Active",
-                "impact": "High",
-                "description": "Speech recognition, acoustic analysis, and audio feature extraction to understand verbal content and sonic patterns."
-            }
-        
-        # Visual factors
-        if analysis.get("has_image"):
-            factors["visual_intelligence"] = {
-                "value": "✓ Enabled",
-                "impact": "High",
-                "description": "Computer vision applied for object recognition, scene understanding, and visual context integration with query semantics."
-            }
-        
-        # Query complexity
-        complexity_level = "High" if query_complexity > WORD_COUNT_THRESHOLD else ("Medium" if query_complexity > 10 else "Low")
-        factors["query_depth"] = {
-            "value": f"{query_complexity} words",
-            "impact": complexity_level,
-            "description": f"{'Complex multi-faceted query requiring layered analysis.' if query_complexity > WORD_COUNT_THRESHOLD else ('Moderate query needing balanced coverage.' if query_complexity > 10 else 'Focused query enabling direct response.')}"
-        }
-        
-        # Response comprehensiveness
-        factors["response_coverage"] = {
-            "value": f"{response_length} words",
-            "impact": "High" if has_detailed_explanation else "Medium",
-            "description": f"{'Extensive coverage with detailed explanations and examples.' if has_detailed_explanation else 'Concise, targeted response focused on essentials.'}"
-        }
-        
-        # Technical analysis
-        if analysis.get("has_technical") or has_technical_terms:
-            factors["domain_expertise"] = {
-                "value": f"Score: {analysis.get('technical_score', 0)}",
-                "impact": "High",
-                "description": "Specialized knowledge applied with technical precision and field-specific methodologies."
-            }
-        
-        # Reasoning complexity
-        reasoning_score = analysis.get("complexity_score", 0)
-        factors["cognitive_depth"] = {
-            "value": f"{reasoning_score:.1%}",
-            "impact": "High" if reasoning_score > 0.6 else ("Medium" if reasoning_score > 0.3 else "Low"),
-            "description": f"{'Multi-layered inference with complex reasoning chains.' if reasoning_score > 0.6 else ('Standard analytical reasoning with logical flow.' if reasoning_score > 0.3 else 'Direct reasoning with straightforward logic.')}"
-        }
-        
-        # Information architecture
-        factors["structural_design"] = {
-            "value": "Structured" if has_structured_format else "Prose",
-            "impact": "Medium",
-            "description": "Organized with hierarchical formatting for clarity." if has_structured_format else "Natural prose for flowing narrative."
-        }
-        
-        # Code/symbolic reasoning
-        if has_code_or_formulas:
-            factors["symbolic_processing"] = {
-                "value": "✓ Applied",
-                "impact": "High",
-                "description": "Mathematical, logical, or programmatic reasoning with formal notation and executable examples."
-            }
-        
-        return factors
-    
-    def toggle_explanations(self, enabled: bool):
-        """Enable or disable AI-generated explanations"""
-        self.explanation_enabled = enabled
-        print(f"✅ Explanations {'enabled' if enabled else 'disabled'}")
-    
-    def clear_cache(self):
-        """Clear response and explanation caches"""
-        self._response_cache.clear()
-        self._explanation_cache.clear()
-    
-    def get_cache_stats(self) -> Dict[str, int]:
-        """Get cache statistics"""
-        return {
-            "cached_responses": len(self._response_cache),
-            "cached_explanations": len(self._explanation_cache),
-            "cache_limit": 50
-        }
-    
-    def reset_rate_limiters(self):
-        """Reset all rate limiters"""
-        self.rapid_limiter.reset()
-        self.advanced_limiter.reset()
+"""
+ClarityNet - Enhanced Backend Module with TRUE Multi-Media Support
+Now with actual video/audio processing and intelligent reasoning explanations
+"""
+
+from config import (
+    get_api_key, MODELS, MODEL_NAMES, COMPLEXITY_THRESHOLD,
+    WORD_COUNT_THRESHOLD, TECHNICAL_KEYWORDS, GENERATION_CONFIG, GENERATION_PROFILES, CONCISE_MAX_WORDS,
+    TECHNICAL_KEYWORD_WEIGHTS, COMPARISON_KEYWORDS, EXPLANATION_KEYWORDS,
+    CACHE_MAX_ENTRIES, CACHE_MAX_BYTES, CACHE_TTL_SECONDS,
+    CACHE_BACKEND, CACHE_DB_PATH, UPLOAD_TTL_SECONDS, UPLOAD_EXPIRY_MARGIN_SECONDS,
+    UPLOAD_QUOTA_BYTES, UPLOAD_GC_INTERVAL_SECONDS, MAX_FILE_SIZE_MB,
+    RATE_LIMIT_MAX_WAIT_SECONDS, RATE_LIMITS, RATE_LIMIT_BACKEND, RATE_LIMIT_DB_PATH,
+    RETRY_MAX_ATTEMPTS, RETRY_BASE_DELAY_SECONDS, RETRY_MAX_DELAY_SECONDS, RETRY_DEADLINE_SECONDS,
+    DEGRADATION_ENABLED, LATENCY_SLO_SECONDS, DEGRADATION_TIERS, DEGRADE_VIDEO_AND_AUDIO,
+    ROUTER_MODEL_PATH, ROUTER_LOG_PATH, HEDGE_ENABLED, HEDGE_DELAY_SECONDS, HEDGE_TIER,
+    IMAGE_MAX_EDGE, IMAGE_OCR_MAX_EDGE, IMAGE_FORMAT, IMAGE_QUALITY, IMAGE_OCR_KEYWORDS, MEDIA_WORKERS,
+    CONVERSATION_MAX_TOKENS, CONVERSATION_SUMMARIZE,
+    MAX_INPUT_TOKENS, TRIM_OVERSIZED_INPUT, TRIM_MIN_QUERY_TOKENS, TOKEN_COUNT_VERIFY_RATIO,
+    IMAGE_TILE_TOKENS, MEDIA_TOKENS_PER_MB,
+    CONTEXT_CACHE_MIN_TOKENS, CONTEXT_CACHE_REFRESH_TOKENS, CONTEXT_CACHE_TTL_SECONDS
+)
+import time
+from typing import Optional, Dict, Any, List, Union, Callable
+from PIL import Image, ImageOps
+import threading
+import asyncio
+import datetime
+import io
+import json
+import hashlib
+import math
+import queue
+import random
+import re
+import sqlite3
+import tempfile
+import weakref
+from functools import lru_cache
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from collections import OrderedDict, deque
+
+
+class LazySDK:
+    """
+    Stands in for google.generativeai until first use
+    Importing the SDK (gRPC, protobuf) dominates startup, so it is imported and configured with
+    the API key on the first attribute access instead of at module import.
+    """
+    
+    def __init__(self):
+        self._module = None
+        self._lock = threading.Lock()
+    
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+    
+    def load(self):
+        """Import and configure the SDK (once) and return the module"""
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    import google.generativeai as module
+                    module.configure(api_key=get_api_key())
+                    self._module = module
+        return self._module
+    
+    def __getattr__(self, name: str):
+        return getattr(self.load(), name)
+
+
+genai = LazySDK()
+
+
+class KeywordMatcher:
+    """
+    One precompiled word-boundary regex over several named keyword groups
+    A single scan of the lowercased text reports the keywords of every group that occur,
+    so "how" no longer matches inside "show" (simple inflections like -s/-ed/-ing still match)
+    """
+    
+    def __init__(self, groups: Dict[str, List[str]]):
+        self.groups = list(groups)
+        self._groups_of = {}  # keyword -> groups it belongs to
+        for group, keywords in groups.items():
+            for keyword in keywords:
+                self._groups_of.setdefault(keyword.lower(), []).append(group)
+        
+        # Longest first so a keyword never shadows a longer one sharing its prefix
+        alternation = "|".join(
+            re.escape(keyword) for keyword in sorted(self._groups_of, key=len, reverse=True)
+        )
+        self._pattern = re.compile(rf"\b(?P<keyword>{alternation})(?:e?s|e?d|ing)?\b") if alternation else None
+    
+    def scan(self, text: str) -> Dict[str, set]:
+        """Map each group name to the set of its keywords found in text"""
+        found = {group: set() for group in self.groups}
+        if self._pattern is not None:
+            for match in self._pattern.finditer(text.lower()):
+                keyword = match.group('keyword')
+                for group in self._groups_of[keyword]:
+                    found[group].add(keyword)
+        return found
+
+
+QUERY_KEYWORDS = KeywordMatcher({
+    "technical": TECHNICAL_KEYWORDS,
+    "comparison": COMPARISON_KEYWORDS,
+    "explanation": EXPLANATION_KEYWORDS
+})
+
+# Queries asking to read text in an image keep more resolution
+OCR_KEYWORDS = KeywordMatcher({"ocr": IMAGE_OCR_KEYWORDS})
+
+
+@lru_cache(maxsize=4096)
+def query_text_features(query: str) -> tuple:
+    """
+    Memoised lexical features of a query:
+    (word_count, char_count, technical_score, has_multiple_questions, has_comparisons, has_explanations)
+    """
+    found = QUERY_KEYWORDS.scan(query)
+    technical_score = sum(TECHNICAL_KEYWORD_WEIGHTS.get(keyword, 3) for keyword in found["technical"])
+    return (
+        len(query.split()),
+        len(query),
+        technical_score,
+        query.count('?') > 1,
+        bool(found["comparison"]),
+        bool(found["explanation"])
+    )
+
+
+def score_complexity(features: Dict[str, Any], minimum: Callable = min) -> Any:
+    """
+    Weighted query complexity used by analyze_query
+    Written with arithmetic and comparisons only, so with minimum=np.minimum it also scores
+    NumPy feature columns element-wise (routing_simulator.py) - live and offline routing share it.
+    """
+    base_complexity = minimum(features["word_count"] / 50, 1.0) * 0.3
+    technical_weight = minimum(features["technical_score"] / 10, 1.0) * 0.25
+    
+    # Video requires more processing than images
+    media_weight = (
+        0.35 * features["has_video"] +
+        0.25 * features["has_audio"] +
+        0.20 * features["has_image"] * (1 - features["has_video"])
+    )
+    
+    question_weight = (
+        0.1 * features["has_multiple_questions"] +
+        0.05 * features["has_comparisons"] +
+        0.05 * features["has_explanations"]
+    )
+    
+    return minimum(base_complexity + technical_weight + media_weight + question_weight, 1.0)
+
+
+def rules_use_advanced(
+    features: Dict[str, Any],
+    complexity: Any,
+    complexity_threshold: float = COMPLEXITY_THRESHOLD,
+    word_threshold: float = WORD_COUNT_THRESHOLD
+) -> Any:
+    """Hand-written model selection rule (video/audio ALWAYS use advanced); scalar or element-wise"""
+    return (
+        features["has_video"] |
+        features["has_audio"] |
+        (complexity > complexity_threshold) |
+        (features["technical_score"] > 0) |
+        (features["word_count"] > word_threshold) |
+        features["has_image"] |
+        features["has_multiple_questions"] |
+        (features["has_comparisons"] & (features["word_count"] > 10))
+    )
+
+
+LIST_MARKER_PATTERN = re.compile(r'[-•*]\s|\d\.\s')  # Bullets or numbered items ("1. ")
+STEP_WORDS = ['first', 'second', 'then', 'finally', 'step']
+STRUCTURE_MARKERS = ['1.', '2.', '3.', '-', '*', '•', '\n\n']
+CODE_MARKERS = ['```', '`', '=', '()', '{}']
+
+
+def response_text_features(answer: str) -> Dict[str, Any]:
+    """
+    Every feature the explanations derive from an answer, from one lowercase and one split
+    The remaining checks are substring searches over that single lowered copy
+    """
+    answer_lower = answer.lower()
+    return {
+        "word_count": len(answer.split()),
+        "has_code": '```' in answer,
+        "has_lists": LIST_MARKER_PATTERN.search(answer) is not None,
+        "has_examples": 'example' in answer_lower or 'instance' in answer_lower,
+        "has_steps": any(word in answer_lower for word in STEP_WORDS),
+        "has_technical_terms": any(keyword in answer_lower for keyword in TECHNICAL_KEYWORDS),
+        "has_structured_format": any(marker in answer for marker in STRUCTURE_MARKERS),
+        "has_code_or_formulas": any(marker in answer for marker in CODE_MARKERS)
+    }
+
+
+# Analysis fields a learned router may weigh; video/audio always route to the advanced model
+ROUTER_FEATURES = [
+    "word_count", "technical_score", "has_multiple_questions", "has_comparisons",
+    "has_explanations", "has_image", "complexity_score"
+]
+
+
+class LearnedRouter:
+    """
+    Small local model predicting whether a query needs the advanced model
+    Loaded from the JSON written by train_router.py, either logistic regression
+    {"type": "logistic", "weights": {feature: w}, "bias": b, "threshold": t} or boosted stumps
+    {"type": "stumps", "stumps": [{"feature", "split", "left", "right"}], "bias": b, "threshold": t}
+    """
+    
+    def __init__(self, spec: Dict[str, Any]):
+        self.kind = spec.get("type", "logistic")
+        self.bias = float(spec.get("bias", 0.0))
+        self.threshold = float(spec.get("threshold", 0.5))
+        
+        if self.kind == "logistic":
+            self._weights = [(name, float(weight)) for name, weight in spec["weights"].items()]
+            names = [name for name, _ in self._weights]
+        elif self.kind == "stumps":
+            self._stumps = [
+                (stump["feature"], float(stump["split"]), float(stump["left"]), float(stump["right"]))
+                for stump in spec["stumps"]
+            ]
+            names = [stump[0] for stump in self._stumps]
+        else:
+            raise ValueError(f"Unknown router model type: {self.kind}")
+        
+        unknown = set(names) - set(ROUTER_FEATURES)
+        if unknown:
+            raise ValueError(f"Unknown router features: {', '.join(sorted(unknown))}")
+    
+    @classmethod
+    def load(cls, path: str) -> Optional["LearnedRouter"]:
+        """Load a router model file, or None (rule-based routing) when it is missing or invalid"""
+        try:
+            with open(path, encoding="utf-8") as f:
+                router = cls(json.load(f))
+            print(f"✅ Learned router loaded: {path} ({router.kind})")
+            return router
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"⚠️ Learned router unavailable, using routing rules: {e}")
+            return None
+    
+    def probability(self, features: Dict[str, Any]) -> float:
+        """Predicted probability that the advanced model is needed"""
+        score = self.bias
+        if self.kind == "logistic":
+            for name, weight in self._weights:
+                score += weight * float(features[name])
+        else:
+            for name, split, left, right in self._stumps:
+                score += left if float(features[name]) <= split else right
+        
+        # Numerically safe sigmoid
+        if score >= 0:
+            return 1.0 / (1.0 + math.exp(-score))
+        odds = math.exp(score)
+        return odds / (1.0 + odds)
+
+
+class RateLimiter:
+    """
+    Sliding-window rate limiter with constant-time admission
+    Callers blocked in acquire()/acquire_async() are admitted in FIFO order,
+    so bursts are smoothed out instead of being rejected
+    """
+    
+    ASYNC_POLL_INTERVAL = 0.05
+    
+    def __init__(self, max_calls: int = 2, period: float = 60.0):
+        self.max_calls = max_calls
+        self.period = period
+        self.calls = deque()
+        self.lock = threading.Lock()
+        self._slot_freed = threading.Condition(self.lock)
+        self._waiters = deque()  # Tickets of blocked callers, oldest first
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+    
+    def _take_slot(self, now: float) -> tuple[bool, float]:
+        """Record a call if the window has room, else return seconds until it does (lock held)"""
+        while self.calls and now - self.calls[0] >= self.period:
+            self.calls.popleft()
+        
+        if len(self.calls) < self.max_calls:
+            self.calls.append(now)
+            return True, 0.0
+        if not self.calls:
+            return False, self.period  # max_calls=0: the window never has room
+        return False, self.period - (now - self.calls[0])
+    
+    def _time_until_free(self, now: float) -> float:
+        """Seconds until the oldest call in the window expires (lock held)"""
+        if len(self.calls) < self.max_calls:
+            return 0.0
+        if not self.calls:
+            return self.period
+        return max(self.period - (now - self.calls[0]), 0.0)
+    
+    def _window_count(self, now: float) -> int:
+        """Calls currently inside the window (lock held)"""
+        return sum(1 for call_time in self.calls if now - call_time < self.period)
+    
+    def can_call(self) -> tuple[bool, float]:
+        """Check if we can make a call, return (can_call, wait_time)"""
+        with self.lock:
+            now = time.time()
+            if self._waiters:
+                # Never let a non-blocking caller jump ahead of queued ones
+                self.rejected += 1
+                return False, self._time_until_free(now)
+            
+            allowed, wait_time = self._take_slot(now)
+            if allowed:
+                self.admitted += 1
+            else:
+                self.rejected += 1
+            return allowed, wait_time
+    
+    def acquire(self, timeout: Optional[float] = None) -> tuple[bool, float]:
+        """
+        Block until a slot is free or timeout seconds pass (None waits indefinitely)
+        Returns (acquired, wait_time) like can_call
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._slot_freed:
+            if not self._waiters:
+                allowed, wait_time = self._take_slot(time.time())
+                if allowed:
+                    self.admitted += 1
+                    return True, 0.0
+            
+            ticket = object()
+            self._waiters.append(ticket)
+            self.queued += 1
+            try:
+                while True:
+                    now = time.time()
+                    is_head = self._waiters[0] is ticket
+                    if is_head:
+                        allowed, wait_time = self._take_slot(now)
+                        if allowed:
+                            self.admitted += 1
+                            return True, 0.0
+                    else:
+                        wait_time = self._time_until_free(now)
+                    
+                    if deadline is not None and now >= deadline:
+                        self.rejected += 1
+                        return False, wait_time
+                    
+                    # The head sleeps until the window frees up; the rest until the head leaves
+                    sleep_for = wait_time if is_head else None
+                    if deadline is not None:
+                        remaining = deadline - now
+                        sleep_for = remaining if sleep_for is None else min(sleep_for, remaining)
+                    self._slot_freed.wait(sleep_for)
+            finally:
+                self._leave_queue(ticket)
+    
+    async def acquire_async(self, timeout: Optional[float] = None) -> tuple[bool, float]:
+        """Awaitable acquire() sharing the same FIFO queue; never blocks the event loop"""
+        deadline = None if timeout is None else time.time() + timeout
+        ticket = object()
+        step = self._admission_step(self._join_queue, ticket)
+        try:
+            outcome = await asyncio.shield(step)
+            while outcome is None:
+                step = self._admission_step(self._poll_queue, ticket, deadline)
+                outcome, sleep_for = await asyncio.shield(step)
+                if outcome is None:
+                    await asyncio.sleep(sleep_for)
+            return outcome
+        finally:
+            # A step interrupted by cancellation still finishes; leave the queue only after it
+            if not step.done():
+                await asyncio.wait([step])
+            await asyncio.shield(self._admission_step(self._quit_queue, ticket))
+    
+    def _admission_step(self, step: Callable, *args) -> asyncio.Future:
+        """Run one locked step of acquire_async; the in-memory window is cheap enough to check inline"""
+        future = asyncio.get_running_loop().create_future()
+        try:
+            future.set_result(step(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+    
+    def _join_queue(self, ticket: object) -> Optional[tuple[bool, float]]:
+        """Take a free slot straight away if nobody is queued, else queue the ticket and return None"""
+        with self.lock:
+            if not self._waiters:
+                allowed, _ = self._take_slot(time.time())
+                if allowed:
+                    self.admitted += 1
+                    return True, 0.0
+            self._waiters.append(ticket)
+            self.queued += 1
+            return None
+    
+    def _poll_queue(self, ticket: object, deadline: Optional[float]) -> tuple:
+        """One check by a queued async caller: (outcome or None, seconds to sleep before the next)"""
+        with self.lock:
+            now = time.time()
+            is_head = self._waiters[0] is ticket
+            if is_head:
+                allowed, wait_time = self._take_slot(now)
+                if allowed:
+                    self.admitted += 1
+                    return (True, 0.0), 0.0
+            else:
+                wait_time = self._time_until_free(now)
+            
+            if deadline is not None and now >= deadline:
+                self.rejected += 1
+                return (False, wait_time), 0.0
+        
+        sleep_for = wait_time if is_head else self.ASYNC_POLL_INTERVAL
+        if deadline is not None:
+            sleep_for = min(sleep_for, deadline - now)
+        return None, sleep_for
+    
+    def _quit_queue(self, ticket: object):
+        """Drop an async caller's ticket if it was queued"""
+        with self.lock:
+            if ticket in self._waiters:
+                self._leave_queue(ticket)
+    
+    def _leave_queue(self, ticket: object):
+        """Drop a ticket and wake the remaining waiters (lock held)"""
+        if self._waiters and self._waiters[0] is ticket:
+            self._waiters.popleft()
+        else:
+            self._waiters.remove(ticket)
+        self._slot_freed.notify_all()
+    
+    def headroom(self) -> int:
+        """Slots a caller could take right now without queueing"""
+        with self.lock:
+            if self._waiters:
+                return 0
+            return max(self.max_calls - self._window_count(time.time()), 0)
+    
+    def expected_wait(self) -> float:
+        """Rough seconds a new caller would queue: until the next free slot, plus one period per full batch ahead"""
+        with self.lock:
+            now = time.time()
+            free = self.max_calls - self._window_count(now)
+            ahead = len(self._waiters)
+            if free > ahead:
+                return 0.0
+            if self.max_calls <= 0:
+                return math.inf
+            return self._time_until_free(now) + ((ahead - free) // self.max_calls) * self.period
+    
+    def stats(self) -> Dict[str, int]:
+        """Admission counters and current window occupancy"""
+        with self.lock:
+            return {
+                "max_calls": self.max_calls,
+                "in_window": self._window_count(time.time()),
+                "waiting": len(self._waiters),
+                "admitted": self.admitted,
+                "queued": self.queued,
+                "rejected": self.rejected
+            }
+    
+    def reset(self):
+        """Reset the rate limiter"""
+        with self.lock:
+            self.calls.clear()
+            self._slot_freed.notify_all()
+
+
+class SharedRateLimiter(RateLimiter):
+    """
+    RateLimiter whose call window lives in SQLite, shared by every process on the host
+    Admission is one short IMMEDIATE transaction, so concurrent workers never over-admit;
+    FIFO queueing still applies among the callers of each process
+    """
+    
+    def __init__(self, name: str, path: str, max_calls: int = 2, period: float = 60.0):
+        super().__init__(max_calls=max_calls, period=period)
+        self.name = name
+        self.path = path
+        self._local = threading.local()
+        
+        conn = self._connect()
+        conn.execute("CREATE TABLE IF NOT EXISTS calls (limiter TEXT NOT NULL, ts REAL NOT NULL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_calls_limiter_ts ON calls (limiter, ts)")
+    
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread; SQLite connections must not be shared across threads"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+    
+    def _take_slot(self, now: float) -> tuple[bool, float]:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "DELETE FROM calls WHERE limiter = ? AND ts <= ?", (self.name, now - self.period)
+            )
+            count, oldest = conn.execute(
+                "SELECT COUNT(*), MIN(ts) FROM calls WHERE limiter = ?", (self.name,)
+            ).fetchone()
+            if count < self.max_calls:
+                conn.execute("INSERT INTO calls VALUES (?, ?)", (self.name, now))
+                conn.execute("COMMIT")
+                return True, 0.0
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if oldest is None:
+            return False, self.period  # max_calls=0: the window never has room
+        return False, max(self.period - (now - oldest), 0.0)
+    
+    def _time_until_free(self, now: float) -> float:
+        count, oldest = self._connect().execute(
+            "SELECT COUNT(*), MIN(ts) FROM calls WHERE limiter = ? AND ts > ?",
+            (self.name, now - self.period)
+        ).fetchone()
+        if count < self.max_calls:
+            return 0.0
+        if oldest is None:
+            return self.period
+        return max(self.period - (now - oldest), 0.0)
+    
+    def _window_count(self, now: float) -> int:
+        return self._connect().execute(
+            "SELECT COUNT(*) FROM calls WHERE limiter = ? AND ts > ?",
+            (self.name, now - self.period)
+        ).fetchone()[0]
+    
+    def _admission_step(self, step: Callable, *args) -> asyncio.Future:
+        """Run the step on a worker thread: BEGIN IMMEDIATE can wait out another process's write lock"""
+        return asyncio.ensure_future(asyncio.to_thread(step, *args))
+    
+    def reset(self):
+        """Reset the rate limiter for every process sharing it"""
+        with self.lock:
+            self._connect().execute("DELETE FROM calls WHERE limiter = ?", (self.name,))
+            self._slot_freed.notify_all()
+
+
+class ResponseCache:
+    """Thread-safe LRU cache with optional TTL and an approximate byte budget"""
+    
+    def __init__(
+        self,
+        max_entries: int = 256,
+        max_bytes: Optional[int] = None,
+        ttl: Optional[float] = None
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (value, size, stored_at)
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.lock = threading.Lock()
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a copy of the cached value, or None on a miss or expired entry"""
+        with self.lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            
+            value, _, stored_at = entry
+            if self.ttl is not None and time.time() - stored_at > self.ttl:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value.copy()
+    
+    def set(self, key: str, value: Dict[str, Any]):
+        """Store a copy of value, evicting least recently used entries to stay in budget"""
+        size = self._estimate_size(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        
+        with self.lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value.copy(), size, time.time())
+            self._bytes += size
+            
+            while len(self._entries) > self.max_entries or (
+                self.max_bytes is not None and self._bytes > self.max_bytes
+            ):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+    
+    def _remove(self, key: str):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+    
+    @classmethod
+    def _estimate_size(cls, value: Any) -> int:
+        """Approximate footprint - text dominates cached results, so count string bytes"""
+        if isinstance(value, str):
+            return len(value.encode('utf-8'))
+        if isinstance(value, dict):
+            return sum(cls._estimate_size(k) + cls._estimate_size(v) for k, v in value.items())
+        if isinstance(value, (list, tuple)):
+            return sum(cls._estimate_size(v) for v in value)
+        return 8
+    
+    def clear(self):
+        """Drop all entries (counters are kept)"""
+        with self.lock:
+            self._entries.clear()
+            self._bytes = 0
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def stats(self) -> Dict[str, int]:
+        """Snapshot of size and hit/miss/eviction counters"""
+        with self.lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
+
+
+class PersistentResponseCache:
+    """
+    SQLite-backed response cache shared by every worker process on the host
+    Runs in WAL mode so readers never block the writer, and keys every row by a
+    config version so entries from other model/generation settings are never served
+    """
+    
+    def __init__(
+        self,
+        path: str,
+        version: str,
+        max_entries: int = 256,
+        max_bytes: Optional[int] = None,
+        ttl: Optional[float] = None
+    ):
+        self.path = path
+        self.version = version
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.lock = threading.Lock()
+        self._local = threading.local()
+        
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " version TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+            " size INTEGER NOT NULL, stored_at REAL NOT NULL, accessed_at REAL NOT NULL,"
+            " PRIMARY KEY (version, key))"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed_at)")
+    
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread; SQLite connections must not be shared across threads"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+    
+    def _count(self, **counter):
+        with self.lock:
+            for name, amount in counter.items():
+                setattr(self, name, getattr(self, name) + amount)
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached value, or None on a miss or expired entry"""
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT value, stored_at FROM responses WHERE version = ? AND key = ?",
+            (self.version, key)
+        ).fetchone()
+        if row is None:
+            self._count(misses=1)
+            return None
+        
+        value, stored_at = row
+        now = time.time()
+        if self.ttl is not None and now - stored_at > self.ttl:
+            conn.execute("DELETE FROM responses WHERE version = ? AND key = ?", (self.version, key))
+            self._count(expirations=1, misses=1)
+            return None
+        
+        try:
+            conn.execute(
+                "UPDATE responses SET accessed_at = ? WHERE version = ? AND key = ?",
+                (now, self.version, key)
+            )
+        except sqlite3.OperationalError:
+            pass  # Recency is best-effort; never fail a hit because another writer holds the lock
+        
+        self._count(hits=1)
+        return json.loads(value)
+    
+    def set(self, key: str, value: Dict[str, Any]):
+        """Store value and evict least recently used rows to stay within budget"""
+        try:
+            payload = json.dumps(value)
+        except (TypeError, ValueError):
+            return
+        size = len(payload.encode('utf-8'))
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (self.version, key, payload, size, now, now)
+            )
+            evicted = self._evict(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if evicted:
+            self._count(evictions=evicted)
+    
+    def _evict(self, conn: sqlite3.Connection) -> int:
+        """Delete oldest-accessed rows (any version) until the table is within budget"""
+        entries, total_bytes = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+        excess_entries = entries - self.max_entries
+        excess_bytes = total_bytes - self.max_bytes if self.max_bytes is not None else 0
+        if excess_entries <= 0 and excess_bytes <= 0:
+            return 0
+        
+        victims = []
+        for version, key, size in conn.execute(
+            "SELECT version, key, size FROM responses ORDER BY accessed_at"
+        ):
+            if excess_entries <= 0 and excess_bytes <= 0:
+                break
+            victims.append((version, key))
+            excess_entries -= 1
+            excess_bytes -= size
+        conn.executemany("DELETE FROM responses WHERE version = ? AND key = ?", victims)
+        return len(victims)
+    
+    def clear(self):
+        """Drop all entries for every version (counters are kept)"""
+        self._connect().execute("DELETE FROM responses")
+    
+    def __len__(self) -> int:
+        return self._connect().execute(
+            "SELECT COUNT(*) FROM responses WHERE version = ?", (self.version,)
+        ).fetchone()[0]
+    
+    def stats(self) -> Dict[str, int]:
+        """Snapshot of shared size plus this process's hit/miss/eviction counters"""
+        entries, total_bytes = self._connect().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses WHERE version = ?",
+            (self.version,)
+        ).fetchone()
+        with self.lock:
+            return {
+                "entries": entries,
+                "bytes": total_bytes,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
+
+
+class UploadRegistry:
+    """
+    Maps media content hashes to uploaded Gemini file handles
+    Live handles are reused instead of uploading identical bytes again, and a background
+    thread drops expired handles and deletes least recently used files over the quota
+    """
+    
+    def __init__(
+        self,
+        quota_bytes: int = UPLOAD_QUOTA_BYTES,
+        default_ttl: float = UPLOAD_TTL_SECONDS,
+        expiry_margin: float = UPLOAD_EXPIRY_MARGIN_SECONDS,
+        gc_interval: float = UPLOAD_GC_INTERVAL_SECONDS
+    ):
+        self.quota_bytes = quota_bytes
+        self.default_ttl = default_ttl
+        self.expiry_margin = expiry_margin
+        self.gc_interval = gc_interval
+        self._entries = OrderedDict()  # digest -> (handle, size, expires_at)
+        self._bytes = 0
+        self.reused = 0
+        self.registered = 0
+        self.deleted = 0
+        self.lock = threading.Lock()
+        self._wake = threading.Event()
+        self._gc_thread = None
+    
+    def get(self, digest: str):
+        """Return a live handle for digest, or None if unknown or about to expire"""
+        with self.lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                return None
+            handle, size, expires_at = entry
+            if expires_at - self.expiry_margin <= time.time():
+                # Too close to remote expiry to hand out; the server deletes it on its own
+                del self._entries[digest]
+                self._bytes -= size
+                return None
+            self._entries.move_to_end(digest)
+            self.reused += 1
+            return handle
+    
+    def register(self, digest: str, handle: Any, size: int):
+        """Remember an uploaded handle and wake the collector if over quota"""
+        expires_at = self._expiry_of(handle)
+        with self.lock:
+            previous = self._entries.pop(digest, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[digest] = (handle, size, expires_at)
+            self._bytes += size
+            self.registered += 1
+            over_quota = self._bytes > self.quota_bytes
+            self._ensure_gc_thread()
+        if over_quota:
+            self._wake.set()
+    
+    def _expiry_of(self, handle: Any) -> float:
+        expiration_time = getattr(handle, 'expiration_time', None)
+        if expiration_time is not None:
+            try:
+                return expiration_time.timestamp()
+            except (AttributeError, OverflowError, ValueError):
+                pass
+        return time.time() + self.default_ttl
+    
+    def _ensure_gc_thread(self):
+        """Start the background collector on first use (caller holds the lock)"""
+        if self._gc_thread is None:
+            self._gc_thread = threading.Thread(
+                target=self._gc_loop, name="claritynet-upload-gc", daemon=True
+            )
+            self._gc_thread.start()
+    
+    def _gc_loop(self):
+        while True:
+            self._wake.wait(self.gc_interval)
+            self._wake.clear()
+            try:
+                self.collect()
+            except Exception as e:
+                print(f"⚠️ Upload garbage collection failed: {e}")
+    
+    def collect(self) -> int:
+        """Drop expired handles and delete LRU remote files until under quota"""
+        now = time.time()
+        to_delete = []
+        with self.lock:
+            for digest, (handle, size, expires_at) in list(self._entries.items()):
+                if expires_at - self.expiry_margin <= now:
+                    del self._entries[digest]
+                    self._bytes -= size
+            while self._bytes > self.quota_bytes and self._entries:
+                _, (handle, size, _) = self._entries.popitem(last=False)
+                self._bytes -= size
+                to_delete.append(handle)
+        
+        for handle in to_delete:
+            try:
+                genai.delete_file(handle.name)
+                self.deleted += 1
+            except Exception as e:
+                print(f"⚠️ Could not delete uploaded file {getattr(handle, 'name', '?')}: {e}")
+        return len(to_delete)
+    
+    def stats(self) -> Dict[str, int]:
+        """Snapshot of tracked remote files and reuse counters"""
+        with self.lock:
+            return {
+                "files": len(self._entries),
+                "bytes": self._bytes,
+                "reused": self.reused,
+                "registered": self.registered,
+                "deleted": self.deleted
+            }
+
+
+HASH_CHUNK_SIZE = 1024 * 1024
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+SPOOL_MAX_MEMORY = 16 * 1024 * 1024  # Larger non-seekable streams spill to a temp file
+
+VIDEO_MIME_TYPES = {'.mp4': 'video/mp4', '.mov': 'video/quicktime', '.avi': 'video/x-msvideo'}
+AUDIO_MIME_TYPES = {'.mp3': 'audio/mpeg', '.wav': 'audio/wav', '.ogg': 'audio/ogg'}
+
+
+def _media_size(media: Any) -> Optional[int]:
+    """Size of an attachment in bytes, determined without reading it (None if unknown)"""
+    if isinstance(media, (bytes, bytearray, memoryview)):
+        return len(media)
+    size = getattr(media, 'size', None)
+    if isinstance(size, int):
+        return size
+    getbuffer = getattr(media, 'getbuffer', None)
+    if getbuffer is not None:
+        with getbuffer() as view:
+            return view.nbytes
+    if not (hasattr(media, 'seekable') and media.seekable()):
+        return None
+    position = media.tell()
+    end = media.seek(0, io.SEEK_END)
+    media.seek(position)
+    return end
+
+
+def _guess_mime_type(name: str, mime_types: Dict[str, str], default: str) -> str:
+    for extension, mime_type in mime_types.items():
+        if name.lower().endswith(extension):
+            return mime_type
+    return default
+
+
+def _stream_digest(media: Any) -> Optional[str]:
+    """Content hash of a file-like object, computed without copying it into a new buffer"""
+    hasher = hashlib.blake2b(digest_size=16)
+    getbuffer = getattr(media, 'getbuffer', None)
+    if getbuffer is not None:
+        # BytesIO / Streamlit UploadedFile: hash the existing buffer in place
+        with getbuffer() as view:
+            hasher.update(view)
+    elif not (hasattr(media, 'seekable') and media.seekable()):
+        return None  # Hashing would consume a one-shot stream
+    else:
+        position = media.tell()
+        media.seek(0)
+        for chunk in iter(lambda: media.read(HASH_CHUNK_SIZE), b''):
+            hasher.update(chunk)
+        media.seek(position)
+    return hasher.hexdigest()
+
+
+_image_sources = {}  # id(image) -> (content hash, encoded size or None), dropped with the image
+_image_sources_lock = threading.Lock()
+
+
+def _image_source(image: Image.Image) -> tuple:
+    """
+    (content hash, encoded size) of an image, captured the first time it is seen
+    Pillow drops image.fp once the pixels are loaded, so the encoded source is only reachable
+    before the first load; remembering the result keeps both stable across repeated sends.
+    """
+    with _image_sources_lock:
+        source = _image_sources.get(id(image))
+        if source is None:
+            fp = getattr(image, 'fp', None)
+            size = _media_size(fp) if fp is not None else None
+            if fp is not None and hasattr(fp, 'getbuffer'):
+                digest = _stream_digest(fp)
+            else:
+                hasher = hashlib.blake2b(digest_size=16)
+                hasher.update(f"{image.mode}:{image.size}".encode('utf-8'))
+                hasher.update(image.tobytes())
+                digest = hasher.hexdigest()
+            source = (digest, size)
+            _image_sources[id(image)] = source
+            weakref.finalize(image, _image_sources.pop, id(image), None)
+        return source
+
+
+def _image_digest(image: Image.Image) -> str:
+    """Content hash of an image - encoded source bytes when reachable on first sight, else pixels"""
+    return _image_source(image)[0]
+
+
+def _preprocess_image(image: Image.Image, max_edge: int) -> tuple:
+    """
+    Orient, downscale and re-encode an image as IMAGE_FORMAT without metadata
+    Returns (blob part for the model request, original bytes, sent bytes)
+    """
+    # Encoded size recorded before the first load; later sends no longer have image.fp
+    original_bytes = _image_source(image)[1]
+    if not original_bytes:
+        original_bytes = len(image.getbands()) * image.width * image.height
+    
+    # Bake the EXIF orientation into the pixels before the EXIF block is dropped
+    image = ImageOps.exif_transpose(image)
+    if max(image.size) > max_edge:
+        image = image.copy()
+        image.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+    
+    transparent = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+    mode = 'RGBA' if transparent and IMAGE_FORMAT != 'JPEG' else 'RGB'
+    if image.mode != mode:
+        image = image.convert(mode)
+    
+    buffer = io.BytesIO()
+    image.save(buffer, format=IMAGE_FORMAT, quality=IMAGE_QUALITY)  # No exif/icc_profile: stripped
+    data = buffer.getvalue()
+    return {"mime_type": Image.MIME[IMAGE_FORMAT], "data": data}, original_bytes, len(data)
+
+
+def _is_quota_error(e: Exception) -> bool:
+    """True for 429 / quota-exhausted API errors, which are worth retrying"""
+    error_msg = str(e).lower()
+    return "429" in error_msg or "quota" in error_msg or "resource exhausted" in error_msg
+
+
+def _server_retry_hint(e: Exception) -> Optional[float]:
+    """Retry delay suggested by the server, from RetryInfo details or the error text"""
+    for detail in getattr(e, 'details', None) or []:
+        delay = getattr(detail, 'retry_delay', None)
+        if delay is None:
+            continue
+        if hasattr(delay, 'total_seconds'):
+            return delay.total_seconds()
+        if hasattr(delay, 'seconds'):
+            return delay.seconds + getattr(delay, 'nanos', 0) / 1e9
+    
+    wait_match = re.search(r'retry.*?(\d+(?:\.\d+)?)\s*s', str(e), re.IGNORECASE)
+    return float(wait_match.group(1)) if wait_match else None
+
+
+def _cache_version() -> str:
+    """Fingerprint of everything that changes what a cached answer would contain"""
+    fingerprint = json.dumps(
+        {"models": MODELS, "generation_config": GENERATION_CONFIG, "generation_profiles": GENERATION_PROFILES},
+        sort_keys=True
+    )
+    return hashlib.sha256(fingerprint.encode('utf-8')).hexdigest()[:16]
+
+
+class MediaTicket:
+    """
+    An attachment whose hashing, preprocessing or upload started before the query was sent
+    Returned by ClarityNetEngine.prefetch_media; pass it to generate_response wherever the
+    media itself would go. "job" resolves to the upload (video/audio) or the preprocessed
+    image, "digest" to the content hash as soon as it is known.
+    """
+    
+    def __init__(self, kind: str, media: Any):
+        self.kind = kind
+        self.media = media
+        self.digest = Future()
+        self.job = None
+        self.max_edge = None  # Image edge the preprocessing job targeted
+        self.cancelled = False
+    
+    @property
+    def usable(self) -> bool:
+        """Whether generate_response can take over this ticket's background work"""
+        return self.job is not None and not self.cancelled and not self.job.cancelled()
+    
+    def cancel(self):
+        """Abandon the prefetch: jobs that haven't started are dropped, running ones finish unused"""
+        self.cancelled = True
+        if self.job is not None:
+            self.job.cancel()
+    
+    def _settle_digest(self, job: Future):
+        """Job callback: a job cancelled before it ran never publishes its digest, so publish None"""
+        if job.cancelled() and not self.digest.done():
+            self.digest.set_result(None)
+
+
+class Conversation:
+    """
+    Turn history for conversation mode
+    Each tier keeps its own explicit context cache of the history prefix it last checkpointed
+    (caches[tier]), so follow-up turns only send what came after it, even when routing
+    alternates between tiers. New checkpoints are created in the background while requests
+    keep using the previous one.
+    """
+    
+    def __init__(self):
+        self.turns = []  # {"role": "user" | "model", "parts": [...], "tokens": int}
+        self.summary = None  # Folded-in text of turns dropped to stay within the token budget
+        self.summary_tokens = 0
+        self.truncated_turns = 0
+        self.caches = {}  # tier -> {"cache", "turns" (history() entries covered), "tokens", "expires_at"}
+        self.checkpoints = {}  # tier -> background job creating that tier's next context cache
+        self.generation = 0  # Bumped whenever the caches are dropped; stale checkpoints are discarded
+        self.folding = None  # Background job summarising the oldest turns, while one runs
+        self.lock = threading.Lock()
+    
+    @property
+    def tokens(self) -> int:
+        """Estimated token size of the whole history"""
+        return self.summary_tokens + sum(turn["tokens"] for turn in self.turns)
+    
+    @property
+    def empty(self) -> bool:
+        """No earlier turns - a request in this conversation is answered like a standalone one"""
+        return not self.turns and not self.summary
+    
+    def history(self) -> List[Dict[str, Any]]:
+        """History as API contents, led by the summary of dropped turns if there is one"""
+        contents = []
+        if self.summary:
+            contents.append({"role": "user", "parts": [f"Summary of our earlier conversation: {self.summary}"]})
+            contents.append({"role": "model", "parts": ["Understood."]})
+        contents.extend({"role": turn["role"], "parts": turn["parts"]} for turn in self.turns)
+        return contents
+
+
+def estimate_text_tokens(text: str) -> int:
+    """
+    Fast local token estimate for text
+    ~4 characters per token for ASCII; other scripts (CJK, emoji) run closer to a token per character
+    """
+    if text.isascii():
+        return len(text) // 4 + 1
+    ascii_chars = len(text.encode('ascii', 'ignore'))
+    return ascii_chars // 4 + (len(text) - ascii_chars) + 1
+
+
+def estimate_image_tokens(size: tuple[int, int], max_edge: int) -> int:
+    """Image cost at the size it is sent: one tile up to 384px, else one per crop tile"""
+    width, height = size
+    scale = min(1.0, max_edge / max(width, height, 1))
+    width, height = max(1, round(width * scale)), max(1, round(height * scale))
+    if width <= 384 and height <= 384:
+        return IMAGE_TILE_TOKENS
+    tile = min(max(min(width, height) / 1.5, 256), 768)
+    return IMAGE_TILE_TOKENS * math.ceil(width / tile) * math.ceil(height / tile)
+
+
+def estimate_media_tokens(media: Any, kind: str) -> int:
+    """Video/audio cost from the file size (the duration isn't known without decoding)"""
+    size = _media_size(media)
+    if size is None:
+        size = MAX_FILE_SIZE_MB * 1024 * 1024  # Unknown size - assume the largest allowed
+    return math.ceil(size / (1024 * 1024) * MEDIA_TOKENS_PER_MB[kind])
+
+
+def _trim_text(text: str, max_tokens: int) -> str:
+    """Keep the start and end of text, cutting its middle to fit about max_tokens"""
+    marker = "\n\n[... trimmed to fit the model's context window ...]\n\n"
+    chars_per_token = len(text) / estimate_text_tokens(text)
+    keep = max(int(max_tokens * chars_per_token) - len(marker), 0)
+    head = keep * 2 // 3
+    return text[:head] + marker + text[len(text) - (keep - head):]
+
+
+class ExplanationHandle:
+    """
+    Deferred reasoning explanation and decision factors for one answer
+    Nothing is computed until .text or .factors is first read; each is then kept on the
+    handle, so a chat message pays for its explanation at most once and only if it is shown.
+    """
+    
+    def __init__(
+        self,
+        engine: "ClarityNetEngine",
+        query: str,
+        answer: str,
+        media_info: Dict[str, Any],
+        analysis: Dict[str, Any]
+    ):
+        self._engine = engine
+        self.query = query
+        self.answer = answer
+        self.media_info = media_info
+        self.analysis = analysis
+        self._text = None
+        self._factors = None
+    
+    @property
+    def text(self) -> str:
+        """The reasoning explanation, generated on first access"""
+        if self._text is None:
+            self._text = self._engine._generate_smart_explanation(
+                self.query, self.answer, self.media_info, self.analysis, self.analysis["use_advanced"]
+            )
+        return self._text
+    
+    @property
+    def factors(self) -> Dict[str, Dict]:
+        """The influencing factors, generated on first access"""
+        if self._factors is None:
+            self._factors = self._engine.get_influencing_factors(self.analysis, self.answer, self.query)
+        return self._factors
+    
+    def __str__(self) -> str:
+        return self.text
+
+
+class LazyModels:
+    """
+    GenerativeModel per tier, built on first use
+    Read-only dict over the tiers in MODELS; a tier that is never routed to is never built.
+    """
+    
+    def __init__(self, model_ids: Dict[str, str]):
+        self._model_ids = dict(model_ids)
+        self._models = {}
+        self._lock = threading.Lock()
+    
+    def __contains__(self, tier: str) -> bool:
+        return tier in self._model_ids
+    
+    def __getitem__(self, tier: str):
+        model = self._models.get(tier)
+        if model is None:
+            model_id = self._model_ids[tier]
+            with self._lock:
+                model = self._models.get(tier)
+                if model is None:
+                    print(f"🔄 Initializing {MODEL_NAMES.get(tier, tier)}: {model_id}")
+                    model = self._models[tier] = genai.GenerativeModel(model_id)
+                    print(f"✅ {MODEL_NAMES.get(tier, tier)} Ready: {model_id}")
+        return model
+    
+    def built(self) -> List[str]:
+        """Tiers whose model has been built so far"""
+        return list(self._models)
+
+
+class ClarityNetEngine:
+    """Enhanced engine for ClarityNet AI with TRUE multimedia support"""
+    
+    def __init__(self):
+        """Set up rate limiters, caches and worker pools - the SDK and models load lazily"""
+        self._limiters = {tier: self._build_rate_limiter(tier) for tier in RATE_LIMITS}
+        self.rapid_limiter = self._limiters["rapid"]
+        self.advanced_limiter = self._limiters["advanced"]
+        
+        # Models are built on first use per tier (see warm_up to build them ahead of traffic)
+        self._models = LazyModels(MODELS)
+        
+        self._generation_configs = {}  # profile -> GenerationConfig, built once on first use
+        
+        self._response_cache = self._build_response_cache()
+        self._explanation_cache = ResponseCache(max_entries=CACHE_MAX_ENTRIES)  # answer digest -> features
+        self._token_counts = ResponseCache(max_entries=CACHE_MAX_ENTRIES)  # request digest -> counted tokens
+        self._upload_registry = UploadRegistry()
+        self._router = LearnedRouter.load(ROUTER_MODEL_PATH) if ROUTER_MODEL_PATH else None
+        self._router_log_lock = threading.Lock()
+        self._hedge_pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix="claritynet-hedge")
+        self._media_pool = ThreadPoolExecutor(max_workers=MEDIA_WORKERS, thread_name_prefix="claritynet-media")
+        self.explanation_enabled = True
+        print("✅ ClarityNet Engine Initialized Successfully!\n")
+    
+    def _build_rate_limiter(self, tier: str) -> RateLimiter:
+        """Create the limiter for a model tier using the backend selected by RATE_LIMIT_BACKEND"""
+        limits = RATE_LIMITS[tier]
+        if RATE_LIMIT_BACKEND == "sqlite":
+            try:
+                return SharedRateLimiter(tier, RATE_LIMIT_DB_PATH, **limits)
+            except sqlite3.Error as e:
+                print(f"⚠️ Shared rate limiter unavailable, limiting per process: {e}")
+        return RateLimiter(**limits)
+    
+    def _build_response_cache(self):
+        """Create the response cache backend selected by CACHE_BACKEND"""
+        if CACHE_BACKEND == "sqlite":
+            try:
+                cache = PersistentResponseCache(
+                    CACHE_DB_PATH,
+                    version=_cache_version(),
+                    max_entries=CACHE_MAX_ENTRIES,
+                    max_bytes=CACHE_MAX_BYTES,
+                    ttl=CACHE_TTL_SECONDS
+                )
+                print(f"✅ Persistent response cache: {CACHE_DB_PATH}")
+                return cache
+            except sqlite3.Error as e:
+                print(f"⚠️ Persistent cache unavailable, using in-memory cache: {e}")
+        
+        return ResponseCache(
+            max_entries=CACHE_MAX_ENTRIES,
+            max_bytes=CACHE_MAX_BYTES,
+            ttl=CACHE_TTL_SECONDS
+        )
+    
+    def analyze_query(self, query: str, media_info: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        Advanced query analysis with multi-dimensional scoring
+        Now properly handles video and audio metadata
+        """
+        if media_info is None:
+            media_info = {"has_image": False, "has_video": False, "has_audio": False}
+        
+        # Word counts, keyword scores and question indicators from one memoised scan
+        (
+            word_count, char_count, technical_score,
+            has_multiple_questions, has_comparisons, has_explanations
+        ) = query_text_features(query)
+        has_technical = technical_score > 0
+        
+        # Media complexity weights
+        has_image = media_info.get("has_image", False)
+        has_video = media_info.get("has_video", False)
+        has_audio = media_info.get("has_audio", False)
+        
+        features = {
+            "word_count": word_count,
+            "technical_score": technical_score,
+            "has_multiple_questions": has_multiple_questions,
+            "has_comparisons": has_comparisons,
+            "has_explanations": has_explanations,
+            "has_image": has_image,
+            "has_video": has_video,
+            "has_audio": has_audio
+        }
+        complexity_score = features["complexity_score"] = score_complexity(features)
+        
+        # Smart model selection - video/audio ALWAYS use advanced
+        router_probability = None
+        if self._router is not None and not (has_video or has_audio):
+            router_probability = self._router.probability(features)
+            use_advanced = router_probability >= self._router.threshold
+        else:
+            use_advanced = rules_use_advanced(features, complexity_score)
+        
+        # Generate reasoning
+        model_selection_reasoning = self._generate_model_selection_reasoning(
+            use_advanced, has_technical, has_image, has_video, has_audio,
+            complexity_score, has_multiple_questions, has_comparisons, has_explanations
+        )
+        if router_probability is not None:
+            model_selection_reasoning += (
+                f" 🧭 Learned router: {router_probability:.0%} likelihood the advanced model is needed"
+            )
+        
+        return {
+            "complexity_score": round(complexity_score, 3),
+            "word_count": word_count,
+            "char_count": char_count,
+            "has_technical": has_technical,
+            "technical_score": technical_score,
+            "has_image": has_image,
+            "has_video": has_video,
+            "has_audio": has_audio,
+            "has_multiple_questions": has_multiple_questions,
+            "has_comparisons": has_comparisons,
+            "has_explanations": has_explanations,
+            "use_advanced": use_advanced,
+            "router": "rules" if router_probability is None else "learned",
+            "router_probability": router_probability,
+            "model_name": MODEL_NAMES["advanced"] if use_advanced else MODEL_NAMES["rapid"],
+            "model_selection_reasoning": model_selection_reasoning
+        }
+    
+    def _generate_model_selection_reasoning(
+        self, use_advanced: bool, has_technical: bool, has_image: bool,
+        has_video: bool, has_audio: bool, score: float,
+        has_multiple: bool, has_comparisons: bool, has_explanations: bool
+    ) -> str:
+        """Generate detailed reasoning for model selection"""
+        reasons = []
+        
+        if has_video:
+            reasons.append("🎬 video analysis with temporal understanding required")
+        if has_audio:
+            reasons.append("🎵 audio processing and speech analysis needed")
+        if has_image and not has_video:
+            reasons.append("🎨 visual analysis required")
+        if has_technical:
+            reasons.append("🔬 specialized technical knowledge needed")
+        if has_multiple:
+            reasons.append("❓ multiple questions requiring comprehensive coverage")
+        if has_comparisons:
+            reasons.append("⚖️ comparative evaluation needed")
+        if has_explanations:
+            reasons.append("📚 deep explanatory analysis required")
+        if score > COMPLEXITY_THRESHOLD and not reasons:
+            reasons.append("🧩 high complexity query detected")
+        
+        if use_advanced:
+            reason_text = ", ".join(reasons) if reasons else "comprehensive analysis needed"
+            return f"**Advanced Reasoning Engine** selected: {reason_text}"
+        else:
+            return "**Rapid Response Engine** selected: straightforward query optimized for speed"
+    
+    def _media_digests(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Content hashes of every attachment that will be sent to the model"""
+        digests = {
+            "images": [
+                (ticket.digest.result() if ticket is not None and ticket.usable else None) or _image_digest(image)
+                for image, ticket in zip((request["images"] or [])[:2], request["tickets"]["images"])
+            ],
+            "video": None,
+            "audio": None
+        }
+        # Video/audio are hashed by their upload jobs, ahead of the upload itself
+        for label, digest in request["upload_digests"].items():
+            digests[label] = digest.result()
+        return digests
+    
+    def _cache_key(
+        self,
+        query: str,
+        model_name: str,
+        media_digests: Dict[str, Any],
+        video: Optional[Any] = None,
+        audio: Optional[Any] = None
+    ) -> Optional[str]:
+        """Response cache key for a (query, model, attached media) triple, None if uncacheable"""
+        if (video is not None and not media_digests["video"]) or (
+            audio is not None and not media_digests["audio"]
+        ):
+            return None  # Attachment could not be hashed without consuming it
+        
+        parts = [query, model_name]
+        parts.extend(f"image:{digest}" for digest in media_digests["images"])
+        if media_digests["video"]:
+            parts.append(f"video:{media_digests['video']}")
+        if media_digests["audio"]:
+            parts.append(f"audio:{media_digests['audio']}")
+        return "_".join(parts)
+    
+    def _upload_media_file(
+        self,
+        media: Union[bytes, Any],
+        mime_type: str,
+        display_name: str,
+        digest: Optional[str] = None
+    ):
+        """
+        Upload media file to Gemini API for processing, reusing a live upload of the same bytes
+        Seekable file objects are streamed to the API in chunks straight from their own buffer;
+        anything else is spooled through a temp file rather than materialised in memory
+        """
+        if digest:
+            uploaded_file = self._upload_registry.get(digest)
+            if uploaded_file is not None:
+                return uploaded_file
+        
+        try:
+            size = _media_size(media)
+            if isinstance(media, (bytes, bytearray, memoryview)):
+                media = io.BytesIO(media)  # Shares the buffer of immutable bytes
+            
+            if isinstance(media, io.IOBase) and media.seekable():
+                media.seek(0)
+                try:
+                    uploaded_file = genai.upload_file(media, mime_type=mime_type, display_name=display_name)
+                finally:
+                    media.seek(0)  # Reset for potential re-use
+            else:
+                with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY) as spool:
+                    limit = MAX_FILE_SIZE_MB * 1024 * 1024
+                    for chunk in iter(lambda: media.read(UPLOAD_CHUNK_SIZE), b''):
+                        spool.write(chunk)
+                        if spool.tell() > limit:
+                            raise ValueError(f"{display_name} exceeds the {MAX_FILE_SIZE_MB} MB limit")
+                    size = spool.tell()
+                    spool.seek(0)
+                    uploaded_file = genai.upload_file(spool, mime_type=mime_type, display_name=display_name)
+            
+            if digest:
+                self._upload_registry.register(digest, uploaded_file, size)
+            return uploaded_file
+        except Exception as e:
+            print(f"❌ Error uploading media file: {e}")
+            return None
+    
+    def _start_uploads(self, request: Dict[str, Any]):
+        """
+        Hash and upload every video/audio attachment concurrently on the media pool
+        Runs alongside analysis, the cache lookup and rate-limit queueing; request["uploads"]
+        holds one future per attachment and request["upload_digests"] one for each content hash.
+        """
+        for spec in self._upload_specs(request):
+            ticket = request["tickets"][spec["label"]]
+            if ticket is not None and ticket.usable:
+                # Prefetched while the user was typing - pick up its job where it is
+                request["upload_digests"][spec["label"]] = ticket.digest
+                request["uploads"].append(ticket.job)
+                continue
+            digest = Future()
+            request["upload_digests"][spec["label"]] = digest
+            request["uploads"].append(self._media_pool.submit(self._ingest_media, spec, digest))
+    
+    def _cancel_uploads(self, request: Dict[str, Any]):
+        """Drop the request's own queued uploads; prefetched jobs stay with their tickets for a resend"""
+        ticket_jobs = [ticket.job for ticket in (request["tickets"]["video"], request["tickets"]["audio"]) if ticket]
+        for upload in request["uploads"]:
+            if not any(upload is job for job in ticket_jobs):
+                upload.cancel()
+    
+    def _ingest_media(self, spec: Dict[str, Any], digest: Future) -> tuple:
+        """Upload job: publish the attachment's hash as soon as it is known, then upload it"""
+        started = time.time()
+        try:
+            digest.set_result(_stream_digest(spec["media"]))
+        except Exception as e:
+            print(f"⚠️ Could not hash {spec['display_name']}: {e}")
+            digest.set_result(None)  # Still uploaded, just never cached or reused
+        hashed = time.time()
+        
+        uploaded_file = self._upload_media_file(
+            spec["media"], spec["mime_type"], spec["display_name"], digest=digest.result()
+        )
+        return uploaded_file, {
+            "media": spec["label"],
+            "display_name": spec["display_name"],
+            "hash_time": round(hashed - started, 3),
+            "upload_time": round(time.time() - hashed, 3),
+            "uploaded": uploaded_file is not None
+        }
+    
+    def _collect_uploads(self, request: Dict[str, Any], outcomes: Optional[List[tuple]] = None) -> List[Any]:
+        """Wait for the request's uploads (unless outcomes are given) and record their timings"""
+        if outcomes is None:
+            outcomes = [upload.result() for upload in request["uploads"]]
+        request["upload_timings"] = [timing for _, timing in outcomes]
+        return [uploaded_file for uploaded_file, _ in outcomes]
+    
+    async def _collect_uploads_async(self, request: Dict[str, Any]) -> List[Any]:
+        """Async counterpart of _collect_uploads"""
+        outcomes = await asyncio.gather(*(asyncio.wrap_future(upload) for upload in request["uploads"]))
+        return self._collect_uploads(request, list(outcomes))
+    
+    def _prepare_request(
+        self,
+        query: str,
+        images: Optional[List[Image.Image]],
+        video: Optional[Any],
+        audio: Optional[Any],
+        conversation: Optional[Conversation] = None
+    ) -> Dict[str, Any]:
+        """
+        Analysis, size checks and cache lookup shared by the sync and async entry points
+        Returns the request context; its "result" is already set when no model call is needed
+        Any attachment may be a MediaTicket from prefetch_media, whose work is then reused.
+        """
+        tickets = {
+            "images": [image if isinstance(image, MediaTicket) else None for image in (images or [])],
+            "video": video if isinstance(video, MediaTicket) else None,
+            "audio": audio if isinstance(audio, MediaTicket) else None
+        }
+        if images:
+            images = [image.media if isinstance(image, MediaTicket) else image for image in images]
+        video = video.media if isinstance(video, MediaTicket) else video
+        audio = audio.media if isinstance(audio, MediaTicket) else audio
+        
+        request = {
+            "query": query,
+            "images": images,
+            "video": video,
+            "audio": audio,
+            "tickets": tickets,
+            "conversation": conversation,
+            "start_time": time.time(),
+            "result": None,
+            "cache_key": None,
+            "media_complete": True,
+            "attempts": 0,
+            "retry_wait_time": 0.0,
+            "uploads": [],
+            "upload_digests": {}
+        }
+        
+        # Prepare media info for analysis
+        media_info = {
+            "has_image": images is not None and len(images) > 0,
+            "has_video": video is not None,
+            "has_audio": audio is not None
+        }
+        request["media_info"] = media_info
+        
+        # Enforce the upload size limit before any attachment bytes are touched
+        size_error = None
+        for label, media in (("Video", video), ("Audio", audio)):
+            size = _media_size(media) if media is not None else None
+            if size is not None and size > MAX_FILE_SIZE_MB * 1024 * 1024:
+                size_mb = size / (1024 * 1024)
+                size_error = f"{label} file is {size_mb:.1f} MB; the limit is {MAX_FILE_SIZE_MB} MB."
+        
+        # Start uploading right away so the round trips overlap analysis and the cache lookup
+        if size_error is None:
+            self._start_uploads(request)
+        
+        # Analyze query with proper media context, then pick a tier with budget (and room) to serve it
+        request["token_estimate"] = self._estimate_tokens(request)
+        request["tokens"] = {
+            "estimated": request["token_estimate"]["total"],
+            "counted": None,
+            "trimmed": 0,
+            "prompt": None,
+            "cached": None,
+            "output": None
+        }
+        request["analysis"] = self.analyze_query(query, media_info)
+        request["analysis"]["estimated_tokens"] = request["token_estimate"]["total"]
+        self._route(request["analysis"])
+        request["analysis"]["generation_profile"] = self._generation_profile(request["analysis"])
+        if size_error is None:
+            size_error = self._fit_input(request)
+        if size_error is not None:
+            self._cancel_uploads(request)
+            request["result"] = self._error_result(request, size_error)
+            return request
+        query = request["query"]  # May have been trimmed to fit
+        
+        # Check cache - attached media is part of the key via its content hash
+        media_digests = self._media_digests(request)
+        request["media_digests"] = media_digests
+        if conversation is None or conversation.empty:  # Later turns depend on the history
+            request["cache_key"] = self._cache_key(
+                query, request["analysis"]['model_name'], media_digests, video, audio
+            )
+        cached = self._response_cache.get(request["cache_key"]) if request["cache_key"] else None
+        if cached is not None:
+            if conversation is not None:
+                # The conversation still needs the attachments of its first turn
+                self._preprocess_images(request)
+                request["turn_parts"] = self._build_content(request, self._collect_uploads(request))
+                self._record_turn(request, cached['response'])
+                cached['conversation'] = self._conversation_info(conversation)
+            else:
+                # Uploads still queued are no longer needed; running ones finish into the registry
+                self._cancel_uploads(request)
+                cached['conversation'] = None
+            cached['from_cache'] = True
+            cached['processing_time'] = time.time() - request["start_time"]
+            cached['attempts'] = 0
+            cached['retry_wait_time'] = 0.0
+            cached['tokens'] = request["tokens"]  # Nothing was sent
+            cached['answer_explanation'] = self._explanation_handle(
+                request, cached['response'], cached['analysis']
+            )
+            request["result"] = cached
+        
+        return request
+    
+    def _select_model(self, analysis: Dict[str, Any]) -> tuple:
+        """Model and rate limiter for the tier chosen by analyze_query and _route"""
+        tier = analysis.get("model_tier") or ("advanced" if analysis["use_advanced"] else "rapid")
+        return self._models[tier], self._limiters[tier]
+    
+    def _route(self, analysis: Dict[str, Any]):
+        """
+        Assign the serving tier, downgrading advanced queries whose queue would miss the latency SLO
+        Records the downgrade and its reason in the analysis
+        """
+        tier = "advanced" if analysis["use_advanced"] else "rapid"
+        analysis["model_tier"] = tier
+        analysis["degraded"] = False
+        
+        # An input the tier can't take goes to the tier with the largest context window
+        estimated_tokens = analysis.get("estimated_tokens") or 0
+        if estimated_tokens > MAX_INPUT_TOKENS.get(tier, math.inf):
+            roomiest = max(MAX_INPUT_TOKENS, key=MAX_INPUT_TOKENS.get)
+            if roomiest != tier and roomiest in self._models:
+                tier = roomiest
+                analysis.update(
+                    model_tier=tier,
+                    model_name=MODEL_NAMES.get(tier, tier),
+                    use_advanced=tier == "advanced"
+                )
+                analysis["model_selection_reasoning"] += (
+                    f" 📏 Input of ~{estimated_tokens:,} tokens needs the larger context window of "
+                    f"**{analysis['model_name']}**"
+                )
+        
+        if tier != "advanced" or not DEGRADATION_ENABLED:
+            return
+        if (analysis["has_video"] or analysis["has_audio"]) and not DEGRADE_VIDEO_AND_AUDIO:
+            return
+        
+        advanced_wait = self._limiters["advanced"].expected_wait()
+        if advanced_wait <= LATENCY_SLO_SECONDS:
+            return
+        
+        for fallback in DEGRADATION_TIERS:
+            limiter = self._limiters.get(fallback)
+            if limiter is None or fallback not in self._models:
+                continue
+            if estimated_tokens > MAX_INPUT_TOKENS.get(fallback, math.inf):
+                continue
+            if limiter.expected_wait() <= LATENCY_SLO_SECONDS:
+                fallback_name = MODEL_NAMES.get(fallback, fallback)
+                analysis.update(
+                    model_tier=fallback,
+                    model_name=fallback_name,
+                    use_advanced=False,
+                    degraded=True
+                )
+                analysis["model_selection_reasoning"] += (
+                    f" ⏬ Downgraded to **{fallback_name}**: advanced model budget exhausted "
+                    f"(~{advanced_wait:.0f}s queue exceeds the {LATENCY_SLO_SECONDS:.0f}s latency target)"
+                )
+                return
+    
+    def _estimate_tokens(self, request: Dict[str, Any]) -> Dict[str, int]:
+        """Local pre-flight estimate of a request's prompt tokens, split by source"""
+        max_edge = IMAGE_OCR_MAX_EDGE if OCR_KEYWORDS.scan(request["query"])["ocr"] else IMAGE_MAX_EDGE
+        media = sum(estimate_image_tokens(image.size, max_edge) for image in (request["images"] or [])[:2])
+        for label in ("video", "audio"):
+            if request[label] is not None:
+                media += estimate_media_tokens(request[label], label)
+        
+        conversation = request["conversation"]
+        estimate = {
+            "query": estimate_text_tokens(request["query"]),
+            "media": media,
+            "history": conversation.tokens if conversation is not None else 0
+        }
+        estimate["total"] = sum(estimate.values())
+        return estimate
+    
+    def _fit_input(self, request: Dict[str, Any]) -> Optional[str]:
+        """
+        Trim an oversized query to the routed tier's input limit
+        Returns an error message instead when trimming is off or would leave too little of the query
+        """
+        tier = request["analysis"]["model_tier"]
+        limit = MAX_INPUT_TOKENS.get(tier, math.inf)
+        estimate = request["token_estimate"]
+        if estimate["total"] <= limit:
+            return None
+        
+        query_budget = limit - (estimate["total"] - estimate["query"])
+        if not TRIM_OVERSIZED_INPUT or query_budget < TRIM_MIN_QUERY_TOKENS:
+            return (
+                f"Request is ~{estimate['total']:,} tokens; "
+                f"{MODEL_NAMES.get(tier, tier)} accepts at most {limit:,}."
+            )
+        
+        request["query"] = _trim_text(request["query"], query_budget)
+        trimmed_tokens = estimate_text_tokens(request["query"])
+        request["tokens"]["trimmed"] = estimate["query"] - trimmed_tokens
+        request["tokens"]["estimated"] = estimate["total"] = estimate["total"] - estimate["query"] + trimmed_tokens
+        estimate["query"] = trimmed_tokens
+        print(f"✂️ Trimmed ~{request['tokens']['trimmed']:,} tokens from an oversized query")
+        return None
+    
+    def _needs_token_count(self, request: Dict[str, Any]) -> bool:
+        """Whether the local estimate is close enough to the input limit to confirm with count_tokens"""
+        limit = MAX_INPUT_TOKENS.get(request["analysis"]["model_tier"], math.inf)
+        return TOKEN_COUNT_VERIFY_RATIO is not None and request["tokens"]["estimated"] >= limit * TOKEN_COUNT_VERIFY_RATIO
+    
+    def _verify_token_count(self, request: Dict[str, Any], model, content: List[Any]) -> Optional[str]:
+        """
+        Confirm a near-limit estimate with the API's count_tokens before generating
+        Counts are memoised by request content; returns an error message if the request doesn't fit
+        """
+        tier = request["analysis"]["model_tier"]
+        limit = MAX_INPUT_TOKENS.get(tier, math.inf)
+        key = self._cache_key(
+            request["query"], tier, request["media_digests"], request["video"], request["audio"]
+        )
+        conversation = request["conversation"]
+        if key and conversation is not None:
+            key += f"|history:{id(conversation)}:{conversation.truncated_turns}:{len(conversation.turns)}"
+        cached = self._token_counts.get(key) if key else None
+        if cached is not None:
+            counted = cached["tokens"]
+        else:
+            try:
+                counted = model.count_tokens(content).total_tokens
+            except Exception as e:
+                print(f"⚠️ Token count failed, relying on the estimate: {e}")
+                return None
+            if key:
+                self._token_counts.set(key, {"tokens": counted})
+        
+        request["tokens"]["counted"] = counted
+        if counted > limit:
+            return f"Request is {counted:,} tokens; {MODEL_NAMES.get(tier, tier)} accepts at most {limit:,}."
+        return None
+    
+    def _record_usage(self, request: Dict[str, Any], response):
+        """Store the API's reported token usage next to the pre-flight estimate"""
+        try:
+            usage = response.usage_metadata
+        except Exception:
+            return  # Not available (e.g. a stream that ended early)
+        if usage is None:
+            return
+        request["tokens"].update(
+            prompt=getattr(usage, "prompt_token_count", None),
+            cached=getattr(usage, "cached_content_token_count", None),
+            output=getattr(usage, "candidates_token_count", None)
+        )
+    
+    def _generation_config(self, profile: str):
+        """Shared GenerationConfig of a GENERATION_PROFILES entry"""
+        config = self._generation_configs.get(profile)
+        if config is None:
+            config = genai.types.GenerationConfig(**{**GENERATION_CONFIG, **GENERATION_PROFILES[profile]})
+            self._generation_configs[profile] = config
+        return config
+    
+    def _generation_profile(self, analysis: Dict[str, Any]) -> str:
+        """Name of the GENERATION_PROFILES entry suited to an analysed query"""
+        if analysis["has_image"] or analysis["has_video"] or analysis["has_audio"]:
+            return "media"
+        if (
+            analysis["complexity_score"] > COMPLEXITY_THRESHOLD or
+            analysis["has_multiple_questions"] or
+            analysis["has_comparisons"] or
+            analysis["has_explanations"] or
+            analysis["word_count"] > WORD_COUNT_THRESHOLD
+        ):
+            return "detailed"
+        if analysis["model_tier"] == "rapid" and analysis["word_count"] <= CONCISE_MAX_WORDS:
+            return "concise"
+        return "standard"
+    
+    def _upload_specs(self, request: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Describe the video/audio attachments of a request that need a remote upload"""
+        return [
+            self._upload_spec(label, request[label])
+            for label in ("video", "audio")
+            if request[label]
+        ]
+    
+    def _upload_spec(self, label: str, media: Any) -> Dict[str, Any]:
+        """Upload description (display name, MIME type) of one video or audio attachment"""
+        mime_types, default_name, default_mime = {
+            "video": (VIDEO_MIME_TYPES, 'video.mp4', 'video/mp4'),
+            "audio": (AUDIO_MIME_TYPES, 'audio.mp3', 'audio/mpeg')
+        }[label]
+        display_name = getattr(media, 'name', default_name)
+        return {
+            "label": label,
+            "media": media,
+            "mime_type": _guess_mime_type(display_name, mime_types, default_mime),
+            "display_name": display_name
+        }
+    
+    def prefetch_media(self, media: Any, kind: str) -> MediaTicket:
+        """
+        Start hashing and uploading (video/audio) or preprocessing (images) an attachment now
+        Call it as soon as a file is attached and pass the returned ticket to generate_response
+        in place of the media; cancel() it if the file is removed before sending.
+        """
+        if kind == "image" and not isinstance(media, Image.Image):
+            # Work on a private copy so the caller can keep reading its own file object
+            media = Image.open(io.BytesIO(media.getvalue() if hasattr(media, 'getvalue') else media.read()))
+        ticket = MediaTicket(kind, media)
+        
+        if kind == "image":
+            ticket.max_edge = IMAGE_MAX_EDGE  # OCR-intent queries redo it at IMAGE_OCR_MAX_EDGE
+            
+            def prepare_image():
+                try:
+                    ticket.digest.set_result(_image_digest(media))
+                except Exception:
+                    ticket.digest.set_result(None)
+                return _preprocess_image(media, ticket.max_edge)
+            ticket.job = self._media_pool.submit(prepare_image)
+        elif kind in ("video", "audio"):
+            size = _media_size(media)
+            if size is None or size <= MAX_FILE_SIZE_MB * 1024 * 1024:
+                ticket.job = self._media_pool.submit(
+                    self._ingest_media, self._upload_spec(kind, media), ticket.digest
+                )
+        else:
+            raise ValueError(f"Unknown media kind: {kind}")
+        if ticket.job is not None:
+            ticket.job.add_done_callback(ticket._settle_digest)
+        return ticket
+    
+    def _preprocess_images(self, request: Dict[str, Any]):
+        """
+        Shrink the request's images for sending, in parallel when there are several
+        Stores the blobs under "image_parts" and the byte savings under "image_preprocessing"
+        """
+        images = (request["images"] or [])[:2]  # Max 2 images
+        if not images:
+            return
+        
+        started = time.time()
+        wants_text = bool(OCR_KEYWORDS.scan(request["query"])["ocr"])
+        max_edge = IMAGE_OCR_MAX_EDGE if wants_text else IMAGE_MAX_EDGE
+        
+        # Prefetched images are reused when they were prepared for the same edge
+        jobs = []
+        for image, ticket in zip(images, request["tickets"]["images"]):
+            if ticket is not None and ticket.usable and ticket.max_edge == max_edge:
+                jobs.append(ticket.job)
+                continue
+            if ticket is not None and ticket.job is not None and not ticket.job.cancel():
+                # The prefetch job may still be decoding this same PIL image, which is not
+                # safe to load from two threads - let it finish before re-processing
+                wait([ticket.job])
+            if len(images) > 1:
+                jobs.append(self._media_pool.submit(_preprocess_image, image, max_edge))
+            else:
+                jobs.append(None)
+        processed = [
+            job.result() if job is not None else _preprocess_image(image, max_edge)
+            for image, job in zip(images, jobs)
+        ]
+        
+        original_bytes = sum(original for _, original, _ in processed)
+        sent_bytes = sum(sent for _, _, sent in processed)
+        request["image_parts"] = [part for part, _, _ in processed]
+        request["image_preprocessing"] = {
+            "images": len(processed),
+            "max_edge": max_edge,
+            "original_bytes": original_bytes,
+            "sent_bytes": sent_bytes,
+            "saved_bytes": original_bytes - sent_bytes,
+            "time": round(time.time() - started, 3)
+        }
+    
+    def _build_content(self, request: Dict[str, Any], uploaded_files: List[Any]) -> List[Any]:
+        """Assemble the model input; a missing upload marks the request as incomplete"""
+        content = [request["query"]]
+        
+        # Add images, downscaled and re-encoded by _preprocess_images
+        content.extend(request.get("image_parts") or [])
+        
+        # Add uploaded video/audio handles
+        content.extend(uploaded for uploaded in uploaded_files if uploaded)
+        request["media_complete"] = all(uploaded_files)
+        return content
+    
+    def _finish_request(self, request: Dict[str, Any], response_text: str) -> Dict[str, Any]:
+        """Explain, package and cache a successful generation"""
+        analysis = request["analysis"]
+        
+        # A hedge won the race - describe the model that actually answered
+        answered_by = request.get("answered_by") or analysis["model_tier"]
+        if answered_by != analysis["model_tier"]:
+            analysis.update(model_name=MODEL_NAMES.get(answered_by, answered_by), use_advanced=False)
+            analysis["model_selection_reasoning"] += (
+                f" 🏁 Hedged: **{analysis['model_name']}** answered first after the advanced model "
+                f"took longer than {HEDGE_DELAY_SECONDS:g}s"
+            )
+        
+        if request["conversation"] is not None:
+            self._record_turn(request, response_text)
+        
+        processing_time = time.time() - request["start_time"]
+        
+        result = {
+            "response": response_text,
+            "answer_explanation": self._explanation_handle(request, response_text, analysis),
+            "analysis": analysis,
+            "success": True,
+            "error": None,
+            "processing_time": round(processing_time, 2),
+            "from_cache": False,
+            "attempts": request["attempts"],
+            "retry_wait_time": round(request["retry_wait_time"], 2),
+            "answered_by": answered_by,
+            "hedged": request.get("hedged", False),
+            "image_preprocessing": request.get("image_preprocessing"),
+            "upload_timings": request.get("upload_timings"),
+            "generation_profile": analysis.get("generation_profile"),
+            "tokens": dict(request["tokens"]),
+            "conversation": request.get("conversation_info")
+        }
+        
+        # Never cache an answer given without all of its attachments, or one from a hedge
+        if request["media_complete"] and request["cache_key"] and answered_by == analysis["model_tier"]:
+            self._response_cache.set(request["cache_key"], dict(result, answer_explanation=None))
+        
+        self._log_routing(request, result)
+        return result
+    
+    def _explanation_handle(
+        self,
+        request: Dict[str, Any],
+        answer: str,
+        analysis: Dict[str, Any]
+    ) -> Optional[ExplanationHandle]:
+        """Lazy explanation for an answer, or None while explanations are turned off"""
+        if not self.explanation_enabled:
+            return None
+        return ExplanationHandle(self, request["query"], answer, request["media_info"], analysis)
+    
+    def _log_routing(self, request: Dict[str, Any], result: Dict[str, Any]):
+        """Append the routing decision and its outcome to ROUTER_LOG_PATH (train_router.py input)"""
+        if not ROUTER_LOG_PATH:
+            return
+        analysis = request["analysis"]
+        record = {
+            "timestamp": request["start_time"],
+            "query": request["query"],
+            "has_image": analysis["has_image"],
+            "has_video": analysis["has_video"],
+            "has_audio": analysis["has_audio"],
+            "model_tier": analysis.get("model_tier"),
+            "answered_by": result.get("answered_by"),
+            "router": analysis["router"],
+            "router_probability": analysis["router_probability"],
+            "generation_profile": analysis.get("generation_profile"),
+            "estimated_tokens": request["tokens"]["estimated"],
+            "prompt_tokens": request["tokens"]["prompt"],
+            "success": result["success"],
+            "error": result["error"],
+            "processing_time": round(result["processing_time"], 3),
+            "attempts": result["attempts"],
+            "response_words": len(result["response"].split()) if result["response"] else 0
+        }
+        try:
+            with self._router_log_lock, open(ROUTER_LOG_PATH, "a", encoding="utf-8") as log:
+                log.write(json.dumps(record) + "\n")
+        except OSError as e:
+            print(f"⚠️ Could not write routing log: {e}")
+    
+    def generate_response(
+        self,
+        query: str,
+        images: Optional[List[Image.Image]] = None,
+        video: Optional[Any] = None,
+        audio: Optional[Any] = None,
+        on_chunk: Optional[Callable[[str], None]] = None,
+        conversation: Optional[Conversation] = None
+    ) -> Dict[str, Any]:
+        """
+        Generate AI response with TRUE multimedia support
+        Now handles images, video, AND audio properly!
+        
+        When on_chunk is given the model output is streamed and every text
+        chunk is passed to it as soon as it arrives; the returned result is
+        the same as in blocking mode. Images, video and audio may be given as
+        MediaTickets from prefetch_media. With a conversation from
+        start_conversation the model sees the earlier turns and the exchange
+        is appended to it.
+        """
+        request = self._prepare_request(query, images, video, audio, conversation)
+        if request["result"] is not None:
+            if on_chunk and request["result"].get('response'):
+                on_chunk(request["result"]['response'])
+            return request["result"]
+        
+        return self._generate_prepared(request, on_chunk)
+    
+    def _generate_prepared(
+        self,
+        request: Dict[str, Any],
+        on_chunk: Optional[Callable[[str], None]] = None,
+        slot_timeout: Optional[float] = RATE_LIMIT_MAX_WAIT_SECONDS
+    ) -> Dict[str, Any]:
+        """
+        Call the model for a prepared request, retrying transparently on quota errors
+        slot_timeout is how long to wait for a rate-limit slot (None waits indefinitely)
+        """
+        try:
+            # Select model and rate limiter
+            model, limiter = self._select_model(request["analysis"])
+            
+            self._preprocess_images(request)
+            content = None
+            if self._needs_token_count(request):
+                # Count a near-limit request before taking a rate-limit slot, so a rejection costs none
+                content = self._build_content(request, self._collect_uploads(request))
+                model, content = self._with_history(request, model, content)
+                count_error = self._verify_token_count(request, model, content)
+                if count_error:
+                    return self._error_result(request, count_error)
+            generation_config = self._generation_config(request["analysis"]["generation_profile"])
+            on_chunk = self._track_streaming(request, on_chunk)
+            
+            while True:
+                request["attempts"] += 1
+                
+                # Check rate limit - every attempt re-enters the limiter's queue
+                can_call, wait_time = limiter.acquire(timeout=self._slot_timeout(request, slot_timeout))
+                request["queued_time"] = time.time() - request["start_time"]
+                if not can_call:
+                    return self._error_result(
+                        request,
+                        f"Rate limit reached. Please wait {int(wait_time)} seconds.",
+                        rate_limited=True,
+                        wait_time=wait_time
+                    )
+                
+                # Uploads ran while we queued for the slot; retries reuse the handles
+                if content is None:
+                    content = self._build_content(request, self._collect_uploads(request))
+                    model, content = self._with_history(request, model, content)
+                
+                try:
+                    # Generate response, racing a hedge against slow advanced calls
+                    hedge_tier = self._hedge_tier(request)
+                    if hedge_tier:
+                        response_text = self._generate_hedged(
+                            request, model, hedge_tier, content, generation_config, on_chunk
+                        )
+                    elif on_chunk:
+                        response = model.generate_content(
+                            content, generation_config=generation_config, stream=True
+                        )
+                        response_text = self._consume_stream(response, on_chunk)
+                        self._record_usage(request, response)
+                    else:
+                        response = model.generate_content(content, generation_config=generation_config)
+                        response_text = self._safe_extract_text(response)
+                        self._record_usage(request, response)
+                    
+                    return self._finish_request(request, response_text)
+                except Exception as e:
+                    delay = self._retry_delay(request, e)
+                    if delay is None:
+                        raise
+                    print(f"🔁 Quota error on attempt {request['attempts']}, retrying in {delay:.1f}s")
+                    time.sleep(delay)
+                    request["retry_wait_time"] += delay
+            
+        except Exception as e:
+            return self._exception_result(request, e)
+    
+    def _hedge_tier(self, request: Dict[str, Any]) -> Optional[str]:
+        """Tier to hedge this request's model call with, or None when it isn't hedged"""
+        analysis = request["analysis"]
+        if not HEDGE_ENABLED or analysis["model_tier"] != "advanced" or request.get("with_history"):
+            return None  # A hedge model couldn't see a conversation's cached context
+        if analysis["has_video"] or analysis["has_audio"] or HEDGE_TIER not in self._models:
+            return None  # Video/audio stay on the advanced model
+        return HEDGE_TIER
+    
+    def _generate_hedged(
+        self,
+        request: Dict[str, Any],
+        model,
+        hedge_tier: str,
+        content: List[Any],
+        generation_config,
+        on_chunk: Optional[Callable[[str], None]]
+    ) -> str:
+        """
+        Run the model call, adding a hedge_tier call if it is still running after HEDGE_DELAY_SECONDS
+        Both racers stream so the loser can stop reading between chunks. With on_chunk the first
+        racer to produce output wins; its chunks are handed back through a queue so on_chunk runs
+        on the caller's thread (UI frameworks like Streamlit drop updates from other threads).
+        Otherwise the first to finish wins.
+        """
+        race = {"winner": None}
+        race_lock = threading.Lock()
+        events = queue.Queue()  # ("chunk", text) from the winner, ("done", tier) as each racer ends
+        
+        def claim(tier: str) -> bool:
+            with race_lock:
+                if race["winner"] is None:
+                    race["winner"] = tier
+                return race["winner"] == tier
+        
+        def run(tier: str, racer_model) -> Optional[str]:
+            try:
+                response = racer_model.generate_content(content, generation_config=generation_config, stream=True)
+                parts = []
+                for chunk in response:
+                    if race["winner"] not in (None, tier):
+                        return None  # Lost the race - abandoning the stream cancels the call
+                    text = self._chunk_text(chunk)
+                    if text:
+                        parts.append(text)
+                        if on_chunk:
+                            if not claim(tier):
+                                return None
+                            events.put(("chunk", text))
+                if not claim(tier):
+                    return None
+                self._record_usage(request, response)
+                return ''.join(parts) if parts else self._safe_extract_text(response)
+            finally:
+                events.put(("done", tier))
+        
+        primary_tier = request["analysis"]["model_tier"]
+        racers = {primary_tier: self._hedge_pool.submit(run, primary_tier, model)}
+        hedge_at = time.time() + HEDGE_DELAY_SECONDS
+        errors, ended = {}, set()
+        
+        while True:
+            try:
+                kind, value = events.get(timeout=max(hedge_at - time.time(), 0) if hedge_at else None)
+            except queue.Empty:
+                hedge_at = None
+                # Hedges never queue: they fire only if the hedge tier has budget right now
+                if race["winner"] is None and self._limiters[hedge_tier].can_call()[0]:
+                    request["hedged"] = True
+                    racers[hedge_tier] = self._hedge_pool.submit(run, hedge_tier, self._models[hedge_tier])
+                continue
+            
+            if kind == "chunk":
+                on_chunk(value)
+                continue
+            ended.add(value)
+            try:
+                response_text = racers[value].result()
+            except Exception as e:
+                errors[value] = e
+                response_text = None
+            if response_text is not None:
+                request["answered_by"] = race["winner"]
+                return response_text
+            if len(ended) == len(racers):
+                # A failure before the hedge delay is raised as-is rather than hedged
+                raise errors.get(primary_tier) or next(iter(errors.values()))
+    
+    async def _generate_hedged_async(
+        self,
+        request: Dict[str, Any],
+        model,
+        hedge_tier: str,
+        content: List[Any],
+        generation_config,
+        on_chunk: Optional[Callable[[str], None]]
+    ) -> str:
+        """Async counterpart of _generate_hedged; the losing racer's task is cancelled outright"""
+        race = {"winner": None}
+        
+        def claim(tier: str) -> bool:
+            if race["winner"] is None:
+                race["winner"] = tier
+            return race["winner"] == tier
+        
+        async def run(tier: str, racer_model) -> Optional[str]:
+            if on_chunk is None:
+                response = await racer_model.generate_content_async(content, generation_config=generation_config)
+                if not claim(tier):
+                    return None
+                self._record_usage(request, response)
+                return self._safe_extract_text(response)
+            
+            response = await racer_model.generate_content_async(
+                content, generation_config=generation_config, stream=True
+            )
+            parts = []
+            async for chunk in response:
+                text = self._chunk_text(chunk)
+                if text:
+                    if not claim(tier):
+                        return None
+                    parts.append(text)
+                    on_chunk(text)
+            if not claim(tier):
+                return None
+            self._record_usage(request, response)
+            return ''.join(parts) if parts else self._safe_extract_text(response)
+        
+        primary_tier = request["analysis"]["model_tier"]
+        primary = asyncio.ensure_future(run(primary_tier, model))
+        pending = {primary}
+        done, _ = await asyncio.wait(pending, timeout=HEDGE_DELAY_SECONDS)
+        if not done:
+            allowed, _ = self._limiters[hedge_tier].can_call()
+            if allowed:
+                request["hedged"] = True
+                pending.add(asyncio.ensure_future(run(hedge_tier, self._models[hedge_tier])))
+        
+        errors = {}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for racer in done:
+                    if racer.exception() is not None:
+                        errors[racer] = racer.exception()
+                    elif racer.result() is not None:
+                        request["answered_by"] = race["winner"]
+                        return racer.result()
+            raise errors.get(primary) or next(iter(errors.values()))
+        finally:
+            for racer in pending:
+                racer.cancel()
+    
+    def _track_streaming(
+        self,
+        request: Dict[str, Any],
+        on_chunk: Optional[Callable[[str], None]]
+    ) -> Optional[Callable[[str], None]]:
+        """Wrap on_chunk so the request remembers that output already reached the caller"""
+        if on_chunk is None:
+            return None
+        
+        def forward(text: str):
+            request["streamed"] = True
+            on_chunk(text)
+        return forward
+    
+    def _slot_timeout(self, request: Dict[str, Any], slot_timeout: Optional[float]) -> Optional[float]:
+        """Limiter wait for the next attempt - retries never wait past the request deadline"""
+        if request["attempts"] == 1:
+            return slot_timeout
+        remaining = max(request["start_time"] + RETRY_DEADLINE_SECONDS - time.time(), 0.0)
+        return remaining if slot_timeout is None else min(slot_timeout, remaining)
+    
+    def _retry_delay(self, request: Dict[str, Any], e: Exception) -> Optional[float]:
+        """
+        Seconds to back off before retrying after e, or None if the request should fail now
+        Jittered exponential backoff, never shorter than the server's own retry hint
+        """
+        if not _is_quota_error(e) or request.get("streamed"):
+            return None  # Not retryable, or the caller has already seen partial output
+        if request["attempts"] >= RETRY_MAX_ATTEMPTS:
+            return None
+        
+        backoff = min(RETRY_BASE_DELAY_SECONDS * 2 ** (request["attempts"] - 1), RETRY_MAX_DELAY_SECONDS)
+        delay = random.uniform(backoff / 2, backoff)  # Jitter spreads out synchronized retries
+        hint = _server_retry_hint(e)
+        if hint is not None:
+            delay = max(delay, hint)
+        
+        if time.time() + delay > request["start_time"] + RETRY_DEADLINE_SECONDS:
+            return None
+        return delay
+    
+    def generate_batch(
+        self,
+        queries: List[Union[str, Dict[str, Any]]],
+        max_workers: Optional[int] = None,
+        slot_timeout: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Run many queries with rate-limit-aware concurrency
+        Items are query strings or dicts with query/images/video/audio keys. Every item is
+        analysed up front and grouped by the engine analyze_query picked; each group runs on
+        its own pool sized to its limiter budget and queues for free slots rather than failing.
+        Results come back in input order with per-item timing under "batch_timing".
+        """
+        batch_start = time.time()
+        requests = []
+        for item in queries:
+            if isinstance(item, str):
+                item = {"query": item}
+            requests.append(self._prepare_request(
+                item["query"], item.get("images"), item.get("video"), item.get("audio")
+            ))
+        
+        # Group uncached items by the limiter that will admit them; repeats of the
+        # same cache key within the batch reuse the first item's answer
+        groups = {}
+        first_by_key = {}
+        duplicates = {}
+        for index, request in enumerate(requests):
+            if request["result"] is not None:
+                continue
+            key = request["cache_key"]
+            if key and key in first_by_key:
+                duplicates[index] = first_by_key[key]
+                continue
+            if key:
+                first_by_key[key] = index
+            _, limiter = self._select_model(request["analysis"])
+            groups.setdefault(id(limiter), (limiter, []))[1].append(index)
+        
+        results = [request["result"] for request in requests]
+        executors = []
+        futures = {}
+        try:
+            for limiter, indices in groups.values():
+                workers = max(min(limiter.max_calls, max_workers or limiter.max_calls, len(indices)), 1)
+                executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="claritynet-batch")
+                executors.append(executor)
+                for index in indices:
+                    futures[index] = executor.submit(
+                        self._generate_prepared, requests[index], None, slot_timeout
+                    )
+            for index, future in futures.items():
+                results[index] = future.result()
+        finally:
+            for executor in executors:
+                executor.shutdown(wait=True)
+        
+        for index, original in duplicates.items():
+            results[index] = dict(results[original], from_cache=results[original]["success"])
+        
+        for index, (request, result) in enumerate(zip(requests, results)):
+            result["batch_index"] = index
+            result["batch_timing"] = {
+                "prepared_at": round(request["start_time"] - batch_start, 3),
+                "queued_time": round(request.get("queued_time", 0.0), 3),
+                "processing_time": round(result["processing_time"], 3)
+            }
+        return results
+    
+    async def generate_response_async(
+        self,
+        query: str,
+        images: Optional[List[Image.Image]] = None,
+        video: Optional[Any] = None,
+        audio: Optional[Any] = None,
+        on_chunk: Optional[Callable[[str], None]] = None,
+        conversation: Optional[Conversation] = None
+    ) -> Dict[str, Any]:
+        """
+        Asyncio counterpart of generate_response built on the SDK's async generation
+        Shares analysis, caching and explanations with the sync path; blocking work
+        (hashing, uploads) runs in worker threads so one event loop can drive many requests
+        """
+        request = await asyncio.to_thread(self._prepare_request, query, images, video, audio, conversation)
+        if request["result"] is not None:
+            if on_chunk and request["result"].get('response'):
+                on_chunk(request["result"]['response'])
+            return request["result"]
+        
+        try:
+            model, limiter = self._select_model(request["analysis"])
+            
+            await asyncio.to_thread(self._preprocess_images, request)
+            content = None
+            if self._needs_token_count(request):
+                content = self._build_content(request, await self._collect_uploads_async(request))
+                model, content = await asyncio.to_thread(self._with_history, request, model, content)
+                count_error = await asyncio.to_thread(self._verify_token_count, request, model, content)
+                if count_error:
+                    return self._error_result(request, count_error)
+            generation_config = self._generation_config(request["analysis"]["generation_profile"])
+            on_chunk = self._track_streaming(request, on_chunk)
+            
+            while True:
+                request["attempts"] += 1
+                
+                can_call, wait_time = await limiter.acquire_async(
+                    timeout=self._slot_timeout(request, RATE_LIMIT_MAX_WAIT_SECONDS)
+                )
+                request["queued_time"] = time.time() - request["start_time"]
+                if not can_call:
+                    return self._error_result(
+                        request,
+                        f"Rate limit reached. Please wait {int(wait_time)} seconds.",
+                        rate_limited=True,
+                        wait_time=wait_time
+                    )
+                
+                if content is None:
+                    content = self._build_content(request, await self._collect_uploads_async(request))
+                    model, content = await asyncio.to_thread(self._with_history, request, model, content)
+                
+                try:
+                    hedge_tier = self._hedge_tier(request)
+                    if hedge_tier:
+                        response_text = await self._generate_hedged_async(
+                            request, model, hedge_tier, content, generation_config, on_chunk
+                        )
+                    elif on_chunk:
+                        response = await model.generate_content_async(
+                            content, generation_config=generation_config, stream=True
+                        )
+                        response_text = await self._consume_stream_async(response, on_chunk)
+                        self._record_usage(request, response)
+                    else:
+                        response = await model.generate_content_async(content, generation_config=generation_config)
+                        response_text = self._safe_extract_text(response)
+                        self._record_usage(request, response)
+                    
+                    # Caching (SQLite with the persistent backend) and the routing log block
+                    return await asyncio.to_thread(self._finish_request, request, response_text)
+                except Exception as e:
+                    delay = self._retry_delay(request, e)
+                    if delay is None:
+                        raise
+                    await asyncio.sleep(delay)
+                    request["retry_wait_time"] += delay
+            
+        except Exception as e:
+            return await asyncio.to_thread(self._exception_result, request, e)
+    
+    def _exception_result(self, request: Dict[str, Any], e: Exception) -> Dict[str, Any]:
+        """Translate an exception raised during generation into a failed result"""
+        error_msg = str(e)
+        
+        if _is_quota_error(e):
+            wait_time = _server_retry_hint(e) or 60.0
+            
+            result = self._error_result(
+                request,
+                f"Rate limit exceeded. Please wait {int(wait_time)} seconds.",
+                rate_limited=True,
+                wait_time=wait_time
+            )
+        else:
+            result = self._error_result(request, error_msg)
+        
+        self._log_routing(request, result)
+        return result
+    
+    def _error_result(self, request: Dict[str, Any], error: str, **extra) -> Dict[str, Any]:
+        """Build the failed-request result dict returned by generate_response"""
+        result = {
+            "response": None,
+            "answer_explanation": None,
+            "analysis": request["analysis"],
+            "success": False,
+            "error": error,
+            "processing_time": time.time() - request["start_time"],
+            "from_cache": False,
+            "attempts": request["attempts"],
+            "retry_wait_time": round(request["retry_wait_time"], 2),
+            "tokens": request.get("tokens")
+        }
+        result.update(extra)
+        return result
+    
+    def _consume_stream(self, response, on_chunk: Callable[[str], None]) -> str:
+        """Forward streamed text chunks to on_chunk as they arrive and return the full text"""
+        parts = []
+        for chunk in response:
+            text = self._chunk_text(chunk)
+            if text:
+                parts.append(text)
+                on_chunk(text)
+        
+        if parts:
+            return ''.join(parts)
+        # Nothing streamed - fall back to the aggregated response for a proper message
+        return self._safe_extract_text(response)
+    
+    async def _consume_stream_async(self, response, on_chunk: Callable[[str], None]) -> str:
+        """Async counterpart of _consume_stream"""
+        parts = []
+        async for chunk in response:
+            text = self._chunk_text(chunk)
+            if text:
+                parts.append(text)
+                on_chunk(text)
+        
+        if parts:
+            return ''.join(parts)
+        return self._safe_extract_text(response)
+    
+    def _chunk_text(self, chunk) -> str:
+        """Text of a streamed chunk; chunks without text parts (safety stops etc.) yield ''"""
+        try:
+            return chunk.text
+        except Exception:
+            return ""
+    
+    def _safe_extract_text(self, response) -> str:
+        """Safely extract text from response with comprehensive error handling"""
+        try:
+            if hasattr(response, 'text') and response.text:
+                return response.text
+            
+            if hasattr(response, 'candidates') and response.candidates:
+                candidate = response.candidates[0]
+                
+                if hasattr(candidate, 'finish_reason'):
+                    finish_reason = candidate.finish_reason
+                    
+                    if finish_reason == 1:
+                        if hasattr(candidate, 'content') and hasattr(candidate.content, 'parts'):
+                            parts_text = []
+                            for part in candidate.content.parts:
+                                if hasattr(part, 'text'):
+                                    parts_text.append(part.text)
+                            if parts_text:
+                                return ''.join(parts_text)
+                    
+                    elif finish_reason == 2:
+                        return "⚠️ Response blocked by safety filters. Please try rephrasing."
+                    elif finish_reason == 3:
+                        return "⚠️ Response blocked due to recitation concerns."
+                    elif finish_reason == 4:
+                        if hasattr(candidate, 'content') and hasattr(candidate.content, 'parts'):
+                            parts_text = []
+                            for part in candidate.content.parts:
+                                if hasattr(part, 'text'):
+                                    parts_text.append(part.text)
+                            if parts_text:
+                                return ''.join(parts_text) + "\n\n[Response truncated]"
+                        return "⚠️ Response exceeded maximum length."
+                    else:
+                        return f"⚠️ Response stopped (reason: {finish_reason})."
+            
+            return "Unable to generate response."
+            
+        except Exception as e:
+            return f"Error extracting response: {str(e)}"
+    
+    def _generate_smart_explanation(
+        self,
+        query: str,
+        answer: str,
+        media_info: Dict[str, Any],
+        analysis: Dict[str, Any],
+        use_advanced: bool
+    ) -> str:
+        """
+        Generate INTELLIGENT, context-aware explanations
+        Focuses on ACTUAL reasoning decisions, not generic descriptions
+        """
+        
+        if answer.startswith("⚠️"):
+            return "Explanation unavailable: Response was blocked or failed."
+        
+        explanation_parts = []
+        
+        # === PART 1: Input Processing Strategy ===
+        explanation_parts.append("🧠 Input Processing Strategy:")
+        
+        processing_decisions = []
+        
+        if media_info.get("has_video"):
+            processing_decisions.append(
+                "Video input required temporal analysis across frames - the AI extracted keyframes, "
+                "analyzed motion patterns, detected scene changes, and tracked object movements over time. "
+                "This multi-frame processing is computationally intensive and requires advanced vision models."
+            )
+        
+        if media_info.get("has_audio"):
+            processing_decisions.append(
+                "Audio analysis involved speech recognition, tone detection, and acoustic feature extraction. "
+                "The AI transcribed spoken content while analyzing vocal patterns, background sounds, and audio quality."
+            )
+        
+        if media_info.get("has_image") and not media_info.get("has_video"):
+            image_query_keywords = ['what', 'who', 'where', 'identify', 'describe', 'show']
+            if any(kw in query.lower() for kw in image_query_keywords):
+                processing_decisions.append(
+                    "Image recognition prioritized object detection and scene understanding - the AI identified "
+                    "entities, classified visual elements, and interpreted spatial relationships to answer your specific question."
+                )
+            else:
+                processing_decisions.append(
+                    "Visual context was integrated with linguistic analysis - the AI used image features "
+                    "to enhance understanding of your text query rather than just describing the image."
+                )
+        
+        if not any(media_info.values()):
+            # Pure text query - analyze linguistic complexity
+            if analysis.get("has_technical"):
+                processing_decisions.append(
+                    "Technical query triggered domain-specific knowledge retrieval - the AI accessed specialized "
+                    "knowledge bases and applied field-specific reasoning frameworks to ensure accuracy."
+                )
+            
+            if analysis.get("has_comparisons"):
+                processing_decisions.append(
+                    "Comparative analysis required building mental models of multiple entities, identifying "
+                    "relevant dimensions for comparison, and evaluating trade-offs across these dimensions."
+                )
+            
+            if analysis.get("has_multiple_questions"):
+                processing_decisions.append(
+                    "Multi-part question required query decomposition - the AI identified distinct sub-questions, "
+                    "determined optimal answering order, and ensured all parts received adequate coverage."
+                )
+        
+        if processing_decisions:
+            explanation_parts.append(" ".join(processing_decisions))
+        else:
+            explanation_parts.append(
+                "Straightforward text query processed through standard linguistic parsing and semantic understanding."
+            )
+        
+        # === PART 2: Reasoning Architecture Selection ===
+        explanation_parts.append("\n**⚙️ Reasoning Architecture Selection:**")
+        
+        if use_advanced:
+            architecture_reasoning = []
+            
+            if media_info.get("has_video") or media_info.get("has_audio"):
+                architecture_reasoning.append(
+                    "Selected advanced multimodal model because video/audio requires specialized processing "
+                    "capabilities not available in rapid models"
+                )
+            elif analysis.get("complexity_score", 0) > 0.6:
+                architecture_reasoning.append(
+                    f"Complexity score of {analysis.get('complexity_score', 0):.2f} indicated need for deep reasoning - "
+                    "advanced model provides better chain-of-thought capabilities and nuanced understanding"
+                )
+            elif analysis.get("has_technical"):
+                architecture_reasoning.append(
+                    "Technical content requires access to specialized knowledge and precise terminology - "
+                    "advanced model has broader domain coverage and better accuracy for expert-level queries"
+                )
+            else:
+                architecture_reasoning.append(
+                    "Advanced model selected to ensure comprehensive coverage and high-quality reasoning"
+                )
+            
+            explanation_parts.append(". ".join(architecture_reasoning) + ".")
+        elif analysis.get("degraded"):
+            explanation_parts.append(
+                f"This query would normally use the advanced model, but its rate budget was exhausted - "
+                f"{analysis.get('model_name')} answered instead to keep response time within the latency target."
+            )
+        else:
+            explanation_parts.append(
+                "Rapid model sufficient for this query - prioritized response speed while maintaining accuracy. "
+                "The query's straightforward nature didn't require deep reasoning chains or specialized processing."
+            )
+        
+        # === PART 3: Answer Construction Decisions ===
+        explanation_parts.append("\n**📝 Answer Construction Decisions:**")
+        
+        construction_choices = []
+        
+        # Analyze actual answer structure
+        answer_features = self._analyze_response(answer)
+        has_code = answer_features["has_code"]
+        has_lists = answer_features["has_lists"]
+        has_examples = answer_features["has_examples"]
+        has_steps = answer_features["has_steps"]
+        
+        if has_code:
+            construction_choices.append(
+                "Included code examples because implementation details are more effective than abstract descriptions "
+                "for technical understanding"
+            )
+        
+        if has_lists and has_steps:
+            construction_choices.append(
+                "Structured as sequential steps because the query implied procedural knowledge - "
+                "ordered format aids execution and comprehension"
+            )
+        elif has_lists:
+            construction_choices.append(
+                "Used list format to present parallel information clearly - each item carries equal weight "
+                "and bullet points improve scannability"
+            )
+        
+        if has_examples:
+            construction_choices.append(
+                "Incorporated concrete examples because abstract concepts become clearer through specific instances - "
+                "examples bridge theory and practice"
+            )
+        
+        # Analyze answer length relative to query
+        answer_length = answer_features["word_count"]
+        query_length = len(query.split())
+        
+        if answer_length > query_length * 5:
+            construction_choices.append(
+                f"Generated comprehensive {answer_length}-word response because your query required thorough exploration - "
+                "prioritized completeness over brevity"
+            )
+        elif answer_length < query_length * 2:
+            construction_choices.append(
+                f"Provided concise {answer_length}-word response because your query had a direct answer - "
+                "avoided unnecessary elaboration"
+            )
+        
+        if construction_choices:
+            explanation_parts.append(". ".join(construction_choices) + ".")
+        else:
+            explanation_parts.append(
+                "Constructed straightforward prose response appropriate for the query's nature."
+            )
+        
+        return "\n".join(explanation_parts)
+    
+    def _analyze_response(self, answer: str) -> Dict[str, Any]:
+        """Answer features, memoised so the explanation and the factors share one analysis"""
+        key = hashlib.blake2b(answer.encode('utf-8'), digest_size=16).hexdigest()
+        features = self._explanation_cache.get(key)
+        if features is None:
+            features = response_text_features(answer)
+            self._explanation_cache.set(key, features)
+        return features
+    
+    def get_influencing_factors(self, analysis: Dict, response: str, query: str) -> Dict[str, Dict]:
+        """Extract comprehensive influencing factors with better categorization"""
+        response_features = self._analyze_response(response)
+        response_length = response_features["word_count"]
+        query_words = query.split()
+        query_complexity = len(query_words)
+        
+        has_technical_terms = response_features["has_technical_terms"]
+        has_detailed_explanation = response_length > 100
+        has_structured_format = response_features["has_structured_format"]
+        has_code_or_formulas = response_features["has_code_or_formulas"]
+        
+        factors = {}
+        
+        # Video/Audio factors
+        if analysis.get("has_video"):
+            factors["temporal_analysis"] = {
+                "value": "✓ Active",
+                "impact": "Critical",
+                "description": "Frame-by-frame video analysis with motion tracking, scene detection, and temporal coherence understanding across the video timeline."
+            }
+        
+        if analysis.get("has_audio"):
+            factors["audio_processing"] = {
+                "value": "✓ Active",
+                "impact": "High",
+                "description": "Speech recognition, acoustic analysis, and audio feature extraction to understand verbal content and sonic patterns."
+            }
+        
+        # Visual factors
+        if analysis.get("has_image"):
+            factors["visual_intelligence"] = {
+                "value": "✓ Enabled",
+                "impact": "High",
+                "description": "Computer vision applied for object recognition, scene understanding, and visual context integration with query semantics."
+            }
+        
+        # Query complexity
+        complexity_level = "High" if query_complexity > WORD_COUNT_THRESHOLD else ("Medium" if query_complexity > 10 else "Low")
+        factors["query_depth"] = {
+            "value": f"{query_complexity} words",
+            "impact": complexity_level,
+            "description": f"{'Complex multi-faceted query requiring layered analysis.' if query_complexity > WORD_COUNT_THRESHOLD else ('Moderate query needing balanced coverage.' if query_complexity > 10 else 'Focused query enabling direct response.')}"
+        }
+        
+        # Response comprehensiveness
+        factors["response_coverage"] = {
+            "value": f"{response_length} words",
+            "impact": "High" if has_detailed_explanation else "Medium",
+            "description": f"{'Extensive coverage with detailed explanations and examples.' if has_detailed_explanation else 'Concise, targeted response focused on essentials.'}"
+        }
+        
+        # Technical analysis
+        if analysis.get("has_technical") or has_technical_terms:
+            factors["domain_expertise"] = {
+                "value": f"Score: {analysis.get('technical_score', 0)}",
+                "impact": "High",
+                "description": "Specialized knowledge applied with technical precision and field-specific methodologies."
+            }
+        
+        # Reasoning complexity
+        reasoning_score = analysis.get("complexity_score", 0)
+        factors["cognitive_depth"] = {
+            "value": f"{reasoning_score:.1%}",
+            "impact": "High" if reasoning_score > 0.6 else ("Medium" if reasoning_score > 0.3 else "Low"),
+            "description": f"{'Multi-layered inference with complex reasoning chains.' if reasoning_score > 0.6 else ('Standard analytical reasoning with logical flow.' if reasoning_score > 0.3 else 'Direct reasoning with straightforward logic.')}"
+        }
+        
+        # Information architecture
+        factors["structural_design"] = {
+            "value": "Structured" if has_structured_format else "Prose",
+            "impact": "Medium",
+            "description": "Organized with hierarchical formatting for clarity." if has_structured_format else "Natural prose for flowing narrative."
+        }
+        
+        # Code/symbolic reasoning
+        if has_code_or_formulas:
+            factors["symbolic_processing"] = {
+                "value": "✓ Applied",
+                "impact": "High",
+                "description": "Mathematical, logical, or programmatic reasoning with formal notation and executable examples."
+            }
+        
+        return factors
+    
+    @property
+    def rapid_model(self):
+        return self._models["rapid"]
+    
+    @property
+    def advanced_model(self):
+        return self._models["advanced"]
+    
+    def warm_up(self, tiers: Optional[List[str]] = None):
+        """
+        Import the SDK and build the models of the given tiers (default: all) ahead of traffic
+        For readiness probes; without it each tier is built by the first request routed to it.
+        """
+        for tier in tiers if tiers is not None else MODELS:
+            self._models[tier]
+        for profile in GENERATION_PROFILES:
+            self._generation_config(profile)
+    
+    def start_conversation(self) -> Conversation:
+        """New conversation to pass to generate_response for multi-turn context"""
+        return Conversation()
+    
+    def end_conversation(self, conversation: Conversation):
+        """Release a conversation's context caches"""
+        with conversation.lock:
+            self._drop_context_caches(conversation)
+    
+    def _with_history(self, request: Dict[str, Any], model, content: List[Any]) -> tuple:
+        """
+        Prepend the conversation history to a request's content
+        Uses the context cache of this request's tier for the checkpointed prefix, so only the
+        turns after it (and the new one) are sent.
+        """
+        conversation = request["conversation"]
+        if conversation is None:
+            return model, content
+        
+        tier = request["analysis"]["model_tier"]
+        with conversation.lock:
+            self._refresh_context_cache(conversation, tier)
+            history = conversation.history()
+            entry = conversation.caches.get(tier)
+            if entry is not None:
+                model = genai.GenerativeModel.from_cached_content(cached_content=entry["cache"])
+                history = history[entry["turns"]:]
+            
+            request["turn_parts"] = content
+            request["with_history"] = bool(history) or entry is not None
+            request["conversation_info"] = self._conversation_info(conversation, entry)
+        return model, history + [{"role": "user", "parts": content}]
+    
+    def _conversation_info(self, conversation: Conversation, entry: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Conversation state reported in a result; entry is the context cache the request used"""
+        return {
+            "turns": len(conversation.turns) // 2,
+            "history_tokens": conversation.tokens,
+            "cached_tokens": entry["tokens"] if entry else 0,
+            "context_cache": entry["cache"].name if entry else None,
+            "truncated_turns": conversation.truncated_turns
+        }
+    
+    def _refresh_context_cache(self, conversation: Conversation, tier: str):
+        """
+        Start checkpointing the history into a new context cache for tier once enough uncached
+        tokens pile up (call with the conversation lock held)
+        Creating the cache is an API round trip that uploads the whole history, so it runs in
+        the background; requests keep using the previous cache until the new one replaces it.
+        """
+        tokens = conversation.tokens
+        entry = conversation.caches.get(tier)
+        if entry is not None and entry["expires_at"] - 60 <= time.time():
+            # Too close to expiry to send a request against
+            self._delete_context_caches([conversation.caches.pop(tier)["cache"]])
+            entry = None
+        stale = entry is None or tokens - entry["tokens"] >= CONTEXT_CACHE_REFRESH_TOKENS
+        if not stale or tokens < CONTEXT_CACHE_MIN_TOKENS or tier in conversation.checkpoints:
+            return
+        
+        conversation.checkpoints[tier] = self._media_pool.submit(
+            self._checkpoint_context, conversation, tier, conversation.history(), tokens, conversation.generation
+        )
+    
+    def _checkpoint_context(
+        self,
+        conversation: Conversation,
+        tier: str,
+        history: List[Dict[str, Any]],
+        tokens: int,
+        generation: int
+    ):
+        """Background job: cache a snapshot of the history for tier, then swap it in for the old cache"""
+        try:
+            cache = genai.caching.CachedContent.create(
+                model=self._models[tier].model_name,
+                contents=history,
+                ttl=datetime.timedelta(seconds=CONTEXT_CACHE_TTL_SECONDS)
+            )
+        except Exception as e:
+            print(f"⚠️ Context cache unavailable, sending full history: {e}")
+            with conversation.lock:
+                conversation.checkpoints.pop(tier, None)
+            return
+        
+        with conversation.lock:
+            conversation.checkpoints.pop(tier, None)
+            if conversation.generation != generation:
+                # History was folded (or the conversation ended) meanwhile - the prefix no longer matches
+                self._delete_context_caches([cache])
+                return
+            previous = conversation.caches.get(tier)
+            if previous is not None:
+                self._delete_context_caches([previous["cache"]])
+            conversation.caches[tier] = {
+                "cache": cache,
+                "turns": len(history),
+                "tokens": tokens,
+                "expires_at": time.time() + CONTEXT_CACHE_TTL_SECONDS
+            }
+        print(f"💬 Context cache checkpoint ({tier}): {len(history)} turns, ~{tokens} tokens")
+    
+    def _drop_context_caches(self, conversation: Conversation):
+        """Forget every tier's context cache of a conversation (call with its lock held)"""
+        self._delete_context_caches([entry["cache"] for entry in conversation.caches.values()])
+        conversation.caches = {}
+        conversation.generation += 1
+    
+    def _delete_context_caches(self, caches: List[Any]):
+        """Delete context caches in the background - they would expire on their own after their TTL"""
+        def delete(cache):
+            try:
+                cache.delete()
+            except Exception as e:
+                print(f"⚠️ Could not delete context cache: {e}")
+        for cache in caches:
+            self._media_pool.submit(delete, cache)
+    
+    def _record_turn(self, request: Dict[str, Any], response_text: str):
+        """
+        Append the finished exchange to its conversation
+        Folding an over-budget history into the summary takes a model call, so it runs in the
+        background; requests meanwhile send the full history.
+        """
+        conversation = request["conversation"]
+        parts = request.get("turn_parts") or [request["query"]]
+        with conversation.lock:
+            conversation.turns.append({
+                "role": "user",
+                "parts": parts,
+                "tokens": request["token_estimate"]["query"] + request["token_estimate"]["media"]
+            })
+            conversation.turns.append({
+                "role": "model",
+                "parts": [response_text],
+                "tokens": estimate_text_tokens(response_text)
+            })
+            if conversation.tokens > CONVERSATION_MAX_TOKENS and conversation.folding is None:
+                conversation.folding = self._media_pool.submit(self._truncate_conversation, conversation)
+    
+    def _truncate_conversation(self, conversation: Conversation):
+        """
+        Fold the oldest exchanges into the summary until the history is back to 3/4 of budget
+        The slack means the (cache-invalidating) truncation happens every few turns, not every turn
+        """
+        try:
+            with conversation.lock:
+                count, tokens = 0, conversation.tokens
+                while len(conversation.turns) - count > 2 and tokens > CONVERSATION_MAX_TOKENS * 0.75:
+                    tokens -= conversation.turns[count]["tokens"] + conversation.turns[count + 1]["tokens"]
+                    count += 2
+                dropped = conversation.turns[:count]
+                previous = conversation.summary
+            if not dropped:
+                return
+            
+            # Only appends happen meanwhile, so the dropped turns are still the oldest ones
+            summary = self._summarize_turns(dropped, previous)
+            with conversation.lock:
+                del conversation.turns[:count]
+                conversation.truncated_turns += count // 2
+                conversation.summary = summary
+                conversation.summary_tokens = estimate_text_tokens(summary)
+                self._drop_context_caches(conversation)  # Their prefixes no longer match the history
+        finally:
+            conversation.folding = None
+    
+    def _summarize_turns(self, turns: List[Dict[str, Any]], previous: Optional[str]) -> str:
+        """Short summary of dropped turns - by the rapid model when it has budget, else their questions"""
+        transcript = "\n".join(
+            f"{turn['role']}: {' '.join(part for part in turn['parts'] if isinstance(part, str))}"
+            for turn in turns
+        )
+        if previous:
+            transcript = f"Earlier summary: {previous}\n{transcript}"
+        
+        if CONVERSATION_SUMMARIZE and self._limiters["rapid"].can_call()[0]:
+            try:
+                response = self._models["rapid"].generate_content(
+                    "Summarise this conversation in under 150 words, keeping names, numbers and "
+                    "decisions the user may refer back to:\n\n" + transcript
+                )
+                summary = self._safe_extract_text(response)
+                if not summary.startswith("⚠️"):
+                    return summary
+            except Exception as e:
+                print(f"⚠️ Conversation summary failed, keeping earlier questions: {e}")
+        
+        questions = [
+            " ".join(part for part in turn["parts"] if isinstance(part, str))[:200]
+            for turn in turns if turn["role"] == "user"
+        ]
+        return " ".join(filter(None, [previous, "The user asked: " + "; ".join(questions)]))
+    
+    def toggle_explanations(self, enabled: bool):
+        """Enable or disable AI-generated explanations"""
+        self.explanation_enabled = enabled
+        print(f"✅ Explanations {'enabled' if enabled else 'disabled'}")
+    
+    def clear_cache(self):
+        """Clear response and explanation caches"""
+        self._response_cache.clear()
+        self._explanation_cache.clear()
+    
+    def get_cache_stats(self) -> Dict[str, int]:
+        """Get cache statistics"""
+        stats = self._response_cache.stats()
+        uploads = self._upload_registry.stats()
+        return {
+            "cached_responses": stats["entries"],
+            "cached_explanations": len(self._explanation_cache),
+            "cache_limit": stats["max_entries"],
+            "cache_bytes": stats["bytes"],
+            "cache_hits": stats["hits"],
+            "cache_misses": stats["misses"],
+            "cache_evictions": stats["evictions"],
+            "cache_expirations": stats["expirations"],
+            "uploaded_files": uploads["files"],
+            "uploaded_bytes": uploads["bytes"],
+            "upload_reuses": uploads["reused"]
+        }
+    
+    def get_rate_limit_stats(self) -> Dict[str, Dict[str, int]]:
+        """Admission counters for each model's rate limiter"""
+        return {tier: limiter.stats() for tier, limiter in self._limiters.items()}
+    
+    def reset_rate_limiters(self):
+        """Reset all rate limiters"""
+        for limiter in self._limiters.values():
+            limiter.reset()
         print("✅ Rate limiters reset")
\ No newline at end of file
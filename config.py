@@ -1,55 +1,170 @@
-"""
-ClarityNet - Configuration File
-Loads API keys and model configs from environment variables.
-"""
-
-import os
-from dotenv import load_dotenv
-
-# Load from .env file (for local development only)
-load_dotenv()
-
-# === 🔐 Gemini API Key (loaded from env or Streamlit Secrets) ===
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-
-if GEMINI_API_KEY is None:
-    raise ValueError("❌ GEMINI_API_KEY not found. Set it in your .env or Streamlit Secrets.")
-
-# === 🤖 Model Settings ===
-MODELS = {
-    "rapid": "gemini-2.0-flash",       # Fast/cheap
-    "advanced": "gemini-2.5-pro",      # Smart/expensive
-}
-
-MODEL_NAMES = {
-    "rapid": "Rapid Response Engine",
-    "advanced": "Advanced Reasoning Engine"
-}
-
-# === 📊 Thresholds ===
-COMPLEXITY_THRESHOLD = 0.6
-WORD_COUNT_THRESHOLD = 50
-
-# === 🧠 Keywords for analysis ===
-TECHNICAL_KEYWORDS = [
-    "explain", "analyze", "how", "why", "what", "describe",
-    "compare", "evaluate", "define", "code", "optimize",
-    "architecture", "algorithm", "debug", "refactor", "develop"
-]
-
-# === ✍️ Generation Configuration ===
-GENERATION_CONFIG = {
-    "temperature": 0.7,
-    "max_output_tokens": 8192,
-    "top_p": 0.95,
-    "top_k": 40
-}
-
-# === 🌐 UI Branding ===
-APP_TITLE = "ClarityNet"
-APP_ICON = "🔮"
-APP_SUBTITLE = "Explainable AI with Transparent Decision Making"
-
-# === 📁 File Uploads ===
-ALLOWED_IMAGE_TYPES = ['png', 'jpg', 'jpeg']
-MAX_FILE_SIZE_MB = 10
+"""
+ClarityNet - Configuration File
+Loads API keys and model configs from environment variables.
+"""
+
+import os
+from dotenv import load_dotenv
+
+# Load from .env file (for local development only)
+load_dotenv()
+
+# === 🔐 Gemini API Key (loaded from env or Streamlit Secrets) ===
+def get_api_key() -> str:
+    """The Gemini API key, validated when first needed rather than at import"""
+    api_key = os.getenv("GEMINI_API_KEY")
+    if api_key is None:
+        raise ValueError("❌ GEMINI_API_KEY not found. Set it in your .env or Streamlit Secrets.")
+    return api_key
+
+
+def __getattr__(name):
+    # Keeps `from config import GEMINI_API_KEY` working, with the check deferred to that import
+    if name == "GEMINI_API_KEY":
+        return get_api_key()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# === 🤖 Model Settings ===
+MODELS = {
+    "rapid": "gemini-2.0-flash",       # Fast/cheap
+    "advanced": "gemini-2.5-pro",      # Smart/expensive
+}
+
+MODEL_NAMES = {
+    "rapid": "Rapid Response Engine",
+    "advanced": "Advanced Reasoning Engine"
+}
+
+# === 📊 Thresholds ===
+COMPLEXITY_THRESHOLD = 0.6
+WORD_COUNT_THRESHOLD = 50
+
+# Typical end-to-end latency per tier, used by routing_simulator.py
+EXPECTED_LATENCY_SECONDS = {"rapid": 3.0, "advanced": 15.0}
+
+# === 🧭 Learned Router ===
+# JSON model written by train_router.py. When unset or unreadable, the rules
+# driven by the thresholds above decide between the rapid and advanced models.
+ROUTER_MODEL_PATH = os.getenv("CLARITYNET_ROUTER_MODEL", "")
+# Append every routing decision and its outcome to this JSONL file ("" disables)
+ROUTER_LOG_PATH = os.getenv("CLARITYNET_ROUTER_LOG", "")
+
+# === 🧠 Keywords for analysis ===
+TECHNICAL_KEYWORDS = [
+    "explain", "analyze", "how", "why", "what", "describe",
+    "compare", "evaluate", "define", "code", "optimize",
+    "architecture", "algorithm", "debug", "refactor", "develop"
+]
+
+# Score each technical keyword adds when present; unlisted keywords weigh 3
+TECHNICAL_KEYWORD_WEIGHTS = {keyword: 3 for keyword in TECHNICAL_KEYWORDS}
+
+COMPARISON_KEYWORDS = ["compare", "versus", "vs", "difference"]
+EXPLANATION_KEYWORDS = ["explain", "why", "how", "analyze"]
+
+# === ✍️ Generation Configuration ===
+GENERATION_CONFIG = {
+    "temperature": 0.7,
+    "max_output_tokens": 8192,
+    "top_p": 0.95,
+    "top_k": 40
+}
+
+# Per-query generation profiles: each overrides GENERATION_CONFIG (any GenerationConfig
+# field, e.g. stop_sequences) and is picked from the analyze_query result
+GENERATION_PROFILES = {
+    "concise": {"max_output_tokens": 1024, "temperature": 0.4},   # Short factual questions
+    "standard": {"max_output_tokens": 4096},
+    "detailed": {"max_output_tokens": 8192},                      # Technical, comparative or multi-part
+    "media": {"max_output_tokens": 8192, "temperature": 0.4}      # Image, video and audio analysis
+}
+CONCISE_MAX_WORDS = 15  # Rapid-tier queries up to this length without other signals get "concise"
+
+# === 🚦 Rate Limiting ===
+RATE_LIMITS = {
+    "rapid": {"max_calls": 15, "period": 60.0},
+    "advanced": {"max_calls": 2, "period": 60.0}
+}
+# "memory" enforces the limits per process; "sqlite" shares them between
+# every worker process on the host so the budgets hold fleet-wide
+RATE_LIMIT_BACKEND = os.getenv("CLARITYNET_RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_DB_PATH = os.getenv("CLARITYNET_RATE_LIMIT_DB", ".claritynet_ratelimit.sqlite3")
+RATE_LIMIT_MAX_WAIT_SECONDS = 20.0   # How long a request queues for a free slot before failing
+
+# === 📉 Budget-aware degradation ===
+# When the advanced model's queue would blow the latency SLO, eligible queries
+# are served by the first fallback tier that can meet it. A third tier (e.g.
+# "lite") needs matching MODELS, MODEL_NAMES and RATE_LIMITS entries.
+DEGRADATION_ENABLED = True
+LATENCY_SLO_SECONDS = 10.0
+DEGRADATION_TIERS = ["rapid"]
+DEGRADE_VIDEO_AND_AUDIO = False     # Video/audio stay on the advanced model by default
+
+# === 🏁 Hedged requests ===
+# When an advanced-model call hasn't answered within HEDGE_DELAY_SECONDS, the
+# same content is also sent to HEDGE_TIER and the first answer wins. A hedge
+# only fires if that tier's rate limiter has a free slot right away.
+HEDGE_ENABLED = False
+HEDGE_DELAY_SECONDS = 8.0
+HEDGE_TIER = "rapid"
+
+# === 🧮 Token Budgeting ===
+MAX_INPUT_TOKENS = {"rapid": 1_048_576, "advanced": 1_048_576}  # Prompt limit per tier
+TRIM_OVERSIZED_INPUT = True   # Cut the middle out of an oversized query instead of rejecting it
+TRIM_MIN_QUERY_TOKENS = 1000  # ...unless less than this much of the query would be left
+# Confirm local estimates above this share of the limit with the API's count_tokens (None: never)
+TOKEN_COUNT_VERIFY_RATIO = 0.8
+IMAGE_TILE_TOKENS = 258
+# ~1 Mbit/s video at 263 + 32 tokens/s, ~128 kbit/s audio at 32 tokens/s
+MEDIA_TOKENS_PER_MB = {"video": 2500, "audio": 2100}
+
+# === 💬 Conversation Mode ===
+CONVERSATION_MAX_TOKENS = 32_000      # History budget; the oldest turns are folded into a summary beyond it
+CONVERSATION_SUMMARIZE = True         # Summarise dropped turns with the rapid model (else keep their questions)
+# Explicit context caching of the stable history prefix
+CONTEXT_CACHE_MIN_TOKENS = 4096       # Smallest prefix the API will cache
+CONTEXT_CACHE_REFRESH_TOKENS = 2048   # Re-checkpoint once this many uncached tokens accumulate
+CONTEXT_CACHE_TTL_SECONDS = 600
+
+# === 🔁 Retries on quota errors (429) ===
+RETRY_MAX_ATTEMPTS = 4
+RETRY_BASE_DELAY_SECONDS = 2.0      # Doubled on every attempt, with jitter
+RETRY_MAX_DELAY_SECONDS = 30.0      # Cap for our own backoff; server retry hints may exceed it
+RETRY_DEADLINE_SECONDS = 120.0      # Never keep a request retrying longer than this
+
+# === 💾 Response Cache ===
+CACHE_MAX_ENTRIES = 256
+CACHE_MAX_BYTES = 32 * 1024 * 1024   # Approximate memory budget for cached results
+CACHE_TTL_SECONDS = 3600             # Set to None to keep entries until evicted
+
+# "memory" keeps a per-process cache; "sqlite" shares one on-disk cache
+# between every worker process on the host and survives restarts
+CACHE_BACKEND = os.getenv("CLARITYNET_CACHE_BACKEND", "memory")
+CACHE_DB_PATH = os.getenv("CLARITYNET_CACHE_DB", ".claritynet_cache.sqlite3")
+
+# === ☁️ Remote Media Uploads ===
+UPLOAD_TTL_SECONDS = 48 * 3600             # Gemini deletes uploaded files after 48 hours
+UPLOAD_EXPIRY_MARGIN_SECONDS = 15 * 60     # Re-upload instead of reusing a handle this close to expiry
+UPLOAD_QUOTA_BYTES = 18 * 1024 ** 3        # Stay below the 20 GB per-project file storage quota
+UPLOAD_GC_INTERVAL_SECONDS = 300
+MEDIA_WORKERS = 4                          # Threads for concurrent uploads and image preprocessing
+
+# === 🖼️ Image Preprocessing ===
+# Images are oriented, downscaled and re-encoded without metadata before sending
+IMAGE_MAX_EDGE = 1536          # Longest side in pixels
+IMAGE_OCR_MAX_EDGE = 3072      # Used instead when the query asks to read text in the image
+IMAGE_FORMAT = "WEBP"          # Compact, keeps transparency; "JPEG" or "PNG" also work
+IMAGE_QUALITY = 85
+IMAGE_OCR_KEYWORDS = [
+    "read", "text", "ocr", "transcribe", "handwriting", "document",
+    "receipt", "screenshot", "written", "says", "label", "sign"
+]
+
+# === 🌐 UI Branding ===
+APP_TITLE = "ClarityNet"
+APP_ICON = "🔮"
+APP_SUBTITLE = "Explainable AI with Transparent Decision Making"
+
+# === 📁 File Uploads ===
+ALLOWED_IMAGE_TYPES = ['png', 'jpg', 'jpeg']
+MAX_FILE_SIZE_MB = 10
@@ -0,0 +1,253 @@
+"""
+ClarityNet - Offline Routing Simulator
+Replays a query log through the analyze_query routing rules under alternative
+thresholds (and optionally a learned router model) and reports the
+rapid/advanced split, expected latency and quota use. The complexity score and
+the rule are the functions analyze_query itself calls, applied to whole columns.
+
+Usage:
+    python routing_simulator.py queries.jsonl
+    python routing_simulator.py queries.jsonl --field body \
+        --complexity-thresholds 0.5 0.6 0.7 --word-thresholds 30 50 80
+    python routing_simulator.py queries.jsonl --router router.json
+
+Each log line is a JSON object holding the query text (``--field``, default
+"query"), optional has_image / has_video / has_audio flags and an optional
+epoch "timestamp" used to measure per-window quota pressure.
+"""
+
+import argparse
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from backend import query_text_features, score_complexity, rules_use_advanced, ROUTER_FEATURES
+from config import (
+    COMPLEXITY_THRESHOLD, WORD_COUNT_THRESHOLD, RATE_LIMITS, EXPECTED_LATENCY_SECONDS
+)
+
+FEATURE_COLUMNS = [
+    "word_count", "technical_score", "has_multiple_questions",
+    "has_comparisons", "has_explanations", "has_image", "has_video", "has_audio"
+]
+
+
+# Features of every query text parsed so far in this process (per worker with --workers);
+# logs repeat popular queries, so each distinct text is extracted once
+_seen_features = {}
+
+
+def _extract_chunk(args) -> Dict[str, list]:
+    """Parse a chunk of log lines into per-feature columns (runs in worker processes)"""
+    lines, field, extra_fields = args
+    extract = query_text_features.__wrapped__  # Skip the LRU lock - _seen_features is the memo
+    # One JSON array parse per chunk instead of a json.loads call per line
+    records = json.loads("[" + ",".join(line for line in lines if line.strip()) + "]")
+    queries = [str(record.get(field, "")) for record in records]
+    for query in set(queries).difference(_seen_features):
+        _seen_features[query] = extract(query)
+    features = [_seen_features[query] for query in queries]
+
+    columns = {
+        "word_count": [feature[0] for feature in features],
+        "technical_score": [feature[2] for feature in features],
+        "has_multiple_questions": [feature[3] for feature in features],
+        "has_comparisons": [feature[4] for feature in features],
+        "has_explanations": [feature[5] for feature in features],
+        "timestamp": [record.get("timestamp", np.nan) for record in records]
+    }
+    for name in ("has_image", "has_video", "has_audio"):
+        columns[name] = [bool(record.get(name)) for record in records]
+    for name in extra_fields:
+        columns[name] = [np.nan if record.get(name) is None else float(record[name]) for record in records]
+    return columns
+
+
+def load_log(
+    path: str,
+    field: str = "query",
+    workers: int = 1,
+    chunk_lines: int = 50_000,
+    extra_fields: Sequence[str] = ()
+) -> Dict[str, np.ndarray]:
+    """
+    Read a JSONL query log and extract the analyze_query features of every line
+    Returns one NumPy column per feature, plus "timestamp" and any numeric extra_fields
+    (NaN where absent). With workers > 1 the lines are parsed in chunks across a process pool.
+    """
+    _seen_features.clear()
+    with open(path, encoding="utf-8") as log:
+        lines = log.readlines()
+    chunks = [(lines[i:i + chunk_lines], field, tuple(extra_fields)) for i in range(0, len(lines), chunk_lines)]
+
+    if workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(_extract_chunk, chunks))
+    else:
+        parts = [_extract_chunk(chunk) for chunk in chunks]
+
+    dtypes = {"word_count": np.float64, "technical_score": np.float64, "timestamp": np.float64}
+    dtypes.update((name, np.float64) for name in extra_fields)
+    return {
+        name: np.array([value for part in parts for value in part[name]], dtype=dtypes.get(name, bool))
+        for name in FEATURE_COLUMNS + ["timestamp", *extra_fields]
+    }
+
+
+def complexity_scores(features: Dict[str, np.ndarray]) -> np.ndarray:
+    """analyze_query's complexity score over whole feature columns"""
+    return score_complexity(features, np.minimum)
+
+
+def route_queries(
+    features: Dict[str, np.ndarray],
+    complexity: np.ndarray,
+    complexity_threshold: float,
+    word_threshold: float
+) -> np.ndarray:
+    """analyze_query's rule-based routing over whole feature columns (True = advanced model)"""
+    return rules_use_advanced(features, complexity, complexity_threshold, word_threshold)
+
+
+def router_probabilities(spec: Dict[str, Any], X: np.ndarray) -> np.ndarray:
+    """Vectorised LearnedRouter.probability over a ROUTER_FEATURES matrix"""
+    score = np.full(len(X), spec["bias"])
+    if spec["type"] == "logistic":
+        score += X @ np.array([spec["weights"][name] for name in ROUTER_FEATURES])
+    else:
+        for stump in spec["stumps"]:
+            column = X[:, ROUTER_FEATURES.index(stump["feature"])]
+            score += np.where(column <= stump["split"], stump["left"], stump["right"])
+    return 1.0 / (1.0 + np.exp(-score))
+
+
+def route_learned(features: Dict[str, np.ndarray], spec: Dict[str, Any]) -> np.ndarray:
+    """Routing with a learned router model; video and audio always use the advanced model"""
+    features = dict(features, complexity_score=complexity_scores(features))
+    X = np.column_stack([features[name].astype(np.float64) for name in ROUTER_FEATURES])
+    return features["has_video"] | features["has_audio"] | (router_probabilities(spec, X) >= spec["threshold"])
+
+
+def quota_report(timestamps: np.ndarray, mask: np.ndarray, tier: str) -> Dict[str, float]:
+    """Calls routed to a tier, and how the log's traffic compares with that tier's rate limit"""
+    limits = RATE_LIMITS[tier]
+    calls = int(mask.sum())
+    report = {
+        "calls": calls,
+        # Shortest wall time in which the limiter could admit every call
+        "min_minutes": calls / limits["max_calls"] * limits["period"] / 60
+    }
+
+    stamps = timestamps[mask]
+    stamps = stamps[~np.isnan(stamps)]
+    if stamps.size:
+        windows = np.floor((stamps - stamps.min()) / limits["period"]).astype(np.int64)
+        per_window = np.bincount(windows)
+        report["peak_per_window"] = int(per_window.max())
+        report["windows_over_limit"] = int((per_window > limits["max_calls"]).sum())
+    return report
+
+
+def _routing_row(features: Dict[str, np.ndarray], advanced: np.ndarray, **labels) -> Dict[str, Any]:
+    """Advanced share, expected latency and per-tier quota use of one routing decision vector"""
+    advanced_share = advanced.sum() / max(len(advanced), 1)
+    return dict(
+        labels,
+        advanced_share=float(advanced_share),
+        expected_latency=float(
+            advanced_share * EXPECTED_LATENCY_SECONDS["advanced"] +
+            (1 - advanced_share) * EXPECTED_LATENCY_SECONDS["rapid"]
+        ),
+        rapid=quota_report(features["timestamp"], ~advanced, "rapid"),
+        advanced=quota_report(features["timestamp"], advanced, "advanced")
+    )
+
+
+def simulate(
+    features: Dict[str, np.ndarray],
+    complexity_thresholds: List[float],
+    word_thresholds: List[float],
+    router_spec: Optional[Dict[str, Any]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Evaluate every (complexity, word count) threshold pair over the whole log, plus the
+    learned router model when one is given. Load-based degradation happens at serving time
+    and is not simulated - these are the routing decisions before it.
+    """
+    complexity = complexity_scores(features)
+    results = [
+        _routing_row(
+            features,
+            route_queries(features, complexity, complexity_threshold, word_threshold),
+            complexity_threshold=complexity_threshold,
+            word_threshold=word_threshold
+        )
+        for complexity_threshold in complexity_thresholds
+        for word_threshold in word_thresholds
+    ]
+    if router_spec is not None:
+        results.append(_routing_row(features, route_learned(features, router_spec), router="learned"))
+    return results
+
+
+def print_report(results: List[Dict[str, Any]], total: int, elapsed: Optional[float] = None):
+    print(f"📊 Routing simulation over {total:,} queries" + (f" ({elapsed:.2f}s)" if elapsed else ""))
+    print(f"{'complexity':>10} {'words':>6} {'advanced':>9} {'latency':>8} "
+          f"{'rapid calls':>12} {'adv calls':>10} {'adv min':>9} {'adv peak':>9}")
+    for row in results:
+        if row.get("router"):
+            label, current = f"{'learned router':>17}", False
+        else:
+            label = f"{row['complexity_threshold']:>10.2f} {row['word_threshold']:>6.0f}"
+            current = (
+                row["complexity_threshold"] == COMPLEXITY_THRESHOLD and
+                row["word_threshold"] == WORD_COUNT_THRESHOLD
+            )
+        print(
+            f"{label} "
+            f"{row['advanced_share']:>8.1%} {row['expected_latency']:>7.1f}s "
+            f"{row['rapid']['calls']:>12,} {row['advanced']['calls']:>10,} "
+            f"{row['advanced']['min_minutes']:>9.1f} "
+            f"{row['advanced'].get('peak_per_window', '-'):>9}"
+            + ("  ← current" if current else "")
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a query log under alternative routing thresholds")
+    parser.add_argument("log", help="JSONL file with one query record per line")
+    parser.add_argument("--field", default="query", help="JSON field holding the query text")
+    parser.add_argument(
+        "--complexity-thresholds", type=float, nargs="+",
+        default=sorted({0.4, 0.5, COMPLEXITY_THRESHOLD, 0.7, 0.8})
+    )
+    parser.add_argument(
+        "--word-thresholds", type=float, nargs="+",
+        default=sorted({25, WORD_COUNT_THRESHOLD, 100})
+    )
+    parser.add_argument("--router", help="Also evaluate this learned router model (train_router.py output)")
+    parser.add_argument("--workers", type=int, default=1, help="Processes used to parse the log")
+    parser.add_argument("--json", action="store_true", help="Print raw results as JSON")
+    args = parser.parse_args()
+
+    router_spec = None
+    if args.router:
+        with open(args.router, encoding="utf-8") as f:
+            router_spec = json.load(f)
+
+    start = time.time()
+    features = load_log(args.log, args.field, args.workers)
+    results = simulate(features, args.complexity_thresholds, args.word_thresholds, router_spec)
+    elapsed = time.time() - start
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results, len(features["word_count"]), elapsed)
+
+
+if __name__ == "__main__":
+    main()
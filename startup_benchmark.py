@@ -0,0 +1,83 @@
+"""
+ClarityNet - Startup Benchmark
+Measures cold-start cost in fresh interpreters: importing the backend, building
+the engine, loading the SDK and rapid model, and (with --query) serving the first
+request end to end.
+
+Usage:
+    python startup_benchmark.py
+    python startup_benchmark.py --runs 10 --query "What is a hash map?"
+
+Without --query no API call is made; "ready" is then the time until the rapid
+model could serve a request.
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, Optional
+
+STAGES = ["import", "engine_init", "warm_up", "first_response"]
+
+
+def measure(query: Optional[str] = None) -> Dict[str, float]:
+    """Time each startup stage in this (fresh) interpreter - imports happen inside on purpose"""
+    timings = {}
+    start = time.perf_counter()
+
+    mark = time.perf_counter()
+    import backend
+    timings["import"] = time.perf_counter() - mark
+
+    mark = time.perf_counter()
+    engine = backend.ClarityNetEngine()
+    timings["engine_init"] = time.perf_counter() - mark
+
+    if query:
+        mark = time.perf_counter()
+        result = engine.generate_response(query)
+        timings["first_response"] = time.perf_counter() - mark
+        timings["success"] = result["success"]
+    else:
+        mark = time.perf_counter()
+        engine.warm_up(["rapid"])
+        timings["warm_up"] = time.perf_counter() - mark
+
+    timings["ready"] = time.perf_counter() - start
+    return timings
+
+
+def run_child(query: Optional[str]) -> Dict[str, float]:
+    """Measure in a new interpreter so every run pays the cold import cost"""
+    command = [sys.executable, __file__, "--child"] + (["--query", query] if query else [])
+    completed = subprocess.run(command, capture_output=True, text=True, check=True)
+    # The engine logs to stdout; the timings are the last line
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure ClarityNet cold-start time")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to average over")
+    parser.add_argument("--query", help="Also send this query and time the first response (uses API quota)")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.query)))
+        return
+
+    runs = [run_child(args.query) for _ in range(args.runs)]
+    print(f"🚀 Startup over {args.runs} cold runs (median / max)")
+    for stage in STAGES + ["ready"]:
+        values = [run[stage] for run in runs if stage in run]
+        if values:
+            print(f"   {stage:<15} {statistics.median(values) * 1000:>9.1f} ms {max(values) * 1000:>9.1f} ms")
+    if args.query:
+        print(f"   Successful first responses: {sum(run['success'] for run in runs)}/{args.runs}")
+
+
+if __name__ == "__main__":
+    main()
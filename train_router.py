@@ -0,0 +1,166 @@
+"""
+ClarityNet - Router Trainer
+Fits the learned router used by analyze_query from a labelled routing log and
+writes it as a small JSON model for CLARITYNET_ROUTER_MODEL.
+
+Usage:
+    python train_router.py routing_log.jsonl router.json
+    python train_router.py routing_log.jsonl router.json --model stumps --min-recall 0.98
+
+Each log line (see CLARITYNET_ROUTER_LOG) needs the query text, the
+has_image / has_video / has_audio flags and a 0/1 label (``--label``, default
+"needs_advanced") that is 1 when the rapid model's answer was not good enough.
+The routing log doesn't judge answers, so the label has to be added to it
+(e.g. from answer reviews). Video and audio queries always use the advanced
+model and are left out.
+"""
+
+import argparse
+import json
+from typing import Any, Dict, Tuple
+
+import numpy as np
+
+from backend import ROUTER_FEATURES, LearnedRouter
+from config import COMPLEXITY_THRESHOLD, WORD_COUNT_THRESHOLD
+from routing_simulator import load_log, complexity_scores, route_queries, router_probabilities
+
+
+def training_data(
+    path: str,
+    field: str = "query",
+    label: str = "needs_advanced",
+    workers: int = 1
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Feature matrix (ROUTER_FEATURES columns), labels and rule-based decisions of the labelled rows"""
+    features = load_log(path, field, workers, extra_fields=[label])
+    features["complexity_score"] = complexity_scores(features)
+    rules = route_queries(features, features["complexity_score"], COMPLEXITY_THRESHOLD, WORD_COUNT_THRESHOLD)
+
+    keep = ~np.isnan(features[label]) & ~features["has_video"] & ~features["has_audio"]
+    X = np.column_stack([features[name].astype(np.float64) for name in ROUTER_FEATURES])[keep]
+    return X, features[label][keep] > 0.5, rules[keep]
+
+
+def fit_logistic(X: np.ndarray, y: np.ndarray, l2: float = 1e-3, iterations: int = 500) -> Dict[str, Any]:
+    """L2-regularised logistic regression by gradient descent on standardised features"""
+    mean = X.mean(axis=0)
+    scale = X.std(axis=0)
+    scale[scale == 0] = 1.0
+    Z = (X - mean) / scale
+
+    weights = np.zeros(X.shape[1])
+    bias = 0.0
+    for _ in range(iterations):
+        error = 1.0 / (1.0 + np.exp(-(Z @ weights + bias))) - y
+        weights -= 0.5 * (Z.T @ error / len(y) + l2 * weights)
+        bias -= 0.5 * error.mean()
+
+    # Fold the standardisation into the weights so the router works on raw features
+    raw_weights = weights / scale
+    return {
+        "type": "logistic",
+        "weights": dict(zip(ROUTER_FEATURES, raw_weights.tolist())),
+        "bias": float(bias - (raw_weights * mean).sum())
+    }
+
+
+def fit_stumps(
+    X: np.ndarray,
+    y: np.ndarray,
+    rounds: int = 100,
+    learning_rate: float = 0.3,
+    l2: float = 1.0
+) -> Dict[str, Any]:
+    """Gradient-boosted decision stumps under logistic loss"""
+    prior = np.clip(y.mean(), 1e-6, 1 - 1e-6)
+    bias = float(np.log(prior / (1 - prior)))
+    score = np.full(len(y), bias)
+    candidates = [np.unique(np.quantile(X[:, j], np.linspace(0, 1, 33)[1:-1])) for j in range(X.shape[1])]
+    stumps = []
+
+    for _ in range(rounds):
+        p = 1.0 / (1.0 + np.exp(-score))
+        gradient, hessian = p - y, p * (1 - p)
+        best = None
+        for j, splits in enumerate(candidates):
+            for split in splits:
+                left = X[:, j] <= split
+                g_left, h_left = gradient[left].sum(), hessian[left].sum()
+                g_right, h_right = gradient.sum() - g_left, hessian.sum() - h_left
+                gain = g_left ** 2 / (h_left + l2) + g_right ** 2 / (h_right + l2)
+                if best is None or gain > best[0]:
+                    best = (gain, j, split, -g_left / (h_left + l2), -g_right / (h_right + l2))
+        if best is None:
+            break
+
+        _, j, split, left_value, right_value = best
+        left_value *= learning_rate
+        right_value *= learning_rate
+        score += np.where(X[:, j] <= split, left_value, right_value)
+        stumps.append({
+            "feature": ROUTER_FEATURES[j],
+            "split": float(split),
+            "left": float(left_value),
+            "right": float(right_value)
+        })
+
+    return {"type": "stumps", "stumps": stumps, "bias": bias}
+
+
+def pick_threshold(probabilities: np.ndarray, y: np.ndarray, min_recall: float) -> float:
+    """Highest threshold that still sends min_recall of the queries needing the advanced model to it"""
+    positives = np.sort(probabilities[y])
+    if not positives.size:
+        return 0.5
+    return float(positives[int(np.floor((1 - min_recall) * positives.size))])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the learned query router from a labelled log")
+    parser.add_argument("log", help="JSONL routing log with a 0/1 label per line")
+    parser.add_argument("output", help="Where to write the router model JSON")
+    parser.add_argument("--field", default="query", help="JSON field holding the query text")
+    parser.add_argument("--label", default="needs_advanced", help="JSON field holding the 0/1 label")
+    parser.add_argument("--model", choices=["logistic", "stumps"], default="logistic")
+    parser.add_argument(
+        "--min-recall", type=float, default=0.95,
+        help="Share of advanced-worthy queries that must still reach the advanced model"
+    )
+    parser.add_argument(
+        "--holdout", type=float, default=0.2,
+        help="Share of rows held out, split evenly between threshold calibration and evaluation"
+    )
+    parser.add_argument("--workers", type=int, default=1, help="Processes used to parse the log")
+    args = parser.parse_args()
+
+    X, y, rules = training_data(args.log, args.field, args.label, args.workers)
+    if len(y) < 10 or y.all() or not y.any():
+        raise SystemExit("❌ Need at least 10 labelled text/image queries covering both labels")
+
+    order = np.random.default_rng(0).permutation(len(y))
+    split = int(len(y) * (1 - args.holdout))
+    calibration_split = split + (len(y) - split) // 2
+    train, calibration, test = order[:split], order[split:calibration_split], order[calibration_split:]
+
+    spec = fit_logistic(X[train], y[train]) if args.model == "logistic" else fit_stumps(X[train], y[train])
+    # Calibrate the threshold on held-out rows so the recall target reflects unseen traffic, and
+    # evaluate on different ones - on the calibration rows the recall target is met by construction
+    spec["threshold"] = pick_threshold(router_probabilities(spec, X[calibration]), y[calibration], args.min_recall)
+    LearnedRouter(spec)  # Validate that the engine can load what we write
+
+    advanced = router_probabilities(spec, X[test]) >= spec["threshold"]
+    print(f"📊 Trained {args.model} router on {len(train):,} queries, "
+          f"calibrated on {len(calibration):,}, evaluated on {len(test):,}")
+    print(f"   Recall on advanced-worthy queries: {advanced[y[test]].mean():.1%} "
+          f"(rules: {rules[test][y[test]].mean():.1%})")
+    print(f"   Accuracy: {(advanced == y[test]).mean():.1%} (rules: {(rules[test] == y[test]).mean():.1%})")
+    print(f"   Routed to rapid: {1 - advanced.mean():.1%} (rules: {1 - rules[test].mean():.1%})")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(spec, f, indent=2)
+    print(f"✅ Router model written to {args.output} - set CLARITYNET_ROUTER_MODEL to use it")
+
+
+if __name__ == "__main__":
+    main()